@@ -0,0 +1,80 @@
+import os
+from contextlib import contextmanager
+
+# pgvector search settings for each quality level. None keeps the server
+# default (hnsw.ef_search = 40, ivfflat.probes = 1). Pick the values from
+# scripts/benchmark_ann.py, which measures recall@k and latency per setting.
+QUALITY_PRESETS = {
+    "fast": {"ef_search": 20, "probes": 1},
+    "balanced": {"ef_search": None, "probes": None},
+    "accurate": {"ef_search": 200, "probes": 20},
+}
+
+# Upper bound of tuples visited by an iterative HNSW scan. Filtered queries
+# keep scanning until they have enough rows or reach this limit.
+ANN_MAX_SCAN_TUPLES = int(os.getenv("ANN_MAX_SCAN_TUPLES", "100000"))
+
+# pgvector rejects larger hnsw.ef_search values.
+MAX_EF_SEARCH = 1000
+
+
+def resolve_ann_settings(quality=None, ef_search=None, probes=None):
+    """
+    Combine a quality preset with explicit overrides.
+
+    :param quality: One of QUALITY_PRESETS, or None for the server defaults.
+    :param ef_search: hnsw.ef_search, overrides the preset.
+    :param probes: ivfflat.probes, overrides the preset.
+    :return: (ef_search, probes); None means "leave unchanged".
+    """
+    if quality is not None and quality not in QUALITY_PRESETS:
+        raise ValueError(
+            f"Unknown quality {quality!r}, expected one of {list(QUALITY_PRESETS)}"
+        )
+    preset = QUALITY_PRESETS.get(quality, {})
+    if ef_search is None:
+        ef_search = preset.get("ef_search")
+    if probes is None:
+        probes = preset.get("probes")
+    if ef_search is not None and not 1 <= ef_search <= MAX_EF_SEARCH:
+        raise ValueError(f"ef_search must be between 1 and {MAX_EF_SEARCH}")
+    if probes is not None and probes < 1:
+        raise ValueError("probes must be positive")
+    return ef_search, probes
+
+
+@contextmanager
+def ann_cursor(db_connection, ef_search=None, probes=None, iterative_limit=None):
+    """
+    Open a transaction and yield a cursor whose vector searches use the given
+    settings. The settings are transaction-local and end with the `with` block.
+
+    The transaction holds `db_connection` until then, so the connection must
+    not be shared with other threads: the backend passes each request a
+    connection of its own from its pool.
+
+    :param ef_search: hnsw.ef_search, or None for the server default.
+    :param probes: ivfflat.probes, or None for the server default.
+    :param iterative_limit: If set, enable pgvector iterative index scans for
+        a filtered query with this LIMIT. Results come back in relaxed order
+        and must be re-sorted by distance.
+    """
+    settings = {}
+    if iterative_limit is not None:
+        settings["hnsw.iterative_scan"] = "relaxed_order"
+        settings["hnsw.max_scan_tuples"] = ANN_MAX_SCAN_TUPLES
+        settings["ivfflat.iterative_scan"] = "relaxed_order"
+        ef_search = min(max(ef_search or 40, iterative_limit), MAX_EF_SEARCH)
+    if ef_search is not None:
+        settings["hnsw.ef_search"] = ef_search
+    if probes is not None:
+        settings["ivfflat.probes"] = probes
+
+    with db_connection.transaction(), db_connection.cursor() as cur:
+        if settings:
+            cur.execute(
+                "SELECT "
+                + ", ".join("set_config(%s, %s, true)" for _ in settings),
+                [v for item in settings.items() for v in (item[0], str(item[1]))],
+            )
+        yield cur
@@ -1,11 +1,347 @@
+import atexit
+import contextvars
 import hashlib
 import inspect
 import json
+import os
+import random
+import threading
+import time
+from collections import Counter
 from functools import wraps
 
+import numpy as np
 import redis
 
-redis_client = redis.Redis(host="localhost", port=6379, db=0)
+from metrics import CACHE_REQUESTS, stage
+
+
+def _text(key):
+    return key.decode() if isinstance(key, bytes) else key
+
+
+class MemoryRedis:
+    """
+    In-process stand-in for the few Redis commands the cache uses, for
+    running without a Redis server (REDIS_URL=memory://). Not shared between
+    worker processes.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.data = {}
+
+    def get(self, key):
+        with self.lock:
+            item = self.data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self.data[key]
+                return None
+            return value
+
+    def setex(self, key, expire_time, value):
+        if isinstance(value, str):
+            value = value.encode()
+        with self.lock:
+            self.data[key] = (value, time.monotonic() + expire_time)
+
+    def exists(self, key):
+        return int(self.get(key) is not None)
+
+    def zincrby(self, name, amount, value):
+        with self.lock:
+            zset = self.data.setdefault(name, ({}, float("inf")))[0]
+            zset[value] = zset.get(value, 0) + amount
+            return zset[value]
+
+    def zrevrange(self, name, start, end, withscores=False):
+        with self.lock:
+            zset = self.data.get(name, ({},))[0]
+            items = sorted(zset.items(), key=lambda item: -item[1])
+        items = items[start : None if end == -1 else end + 1]
+        if withscores:
+            return [(k.encode(), float(v)) for k, v in items]
+        return [k.encode() for k, _ in items]
+
+    def zrange(self, name, start, end):
+        with self.lock:
+            zset = self.data.get(name, ({},))[0]
+            items = sorted(zset.items(), key=lambda item: item[1])
+        # Negative ends count from the highest score, as in Redis.
+        end = len(items) + end if end < 0 else end
+        return [k.encode() for k, _ in items[start : end + 1]]
+
+    def zcard(self, name):
+        with self.lock:
+            return len(self.data.get(name, ({},))[0])
+
+    def zrem(self, name, *values):
+        with self.lock:
+            zset = self.data.get(name, ({},))[0]
+            return sum(zset.pop(_text(v), None) is not None for v in values)
+
+    def hsetnx(self, name, key, value):
+        with self.lock:
+            hash_ = self.data.setdefault(name, ({}, float("inf")))[0]
+            if key in hash_:
+                return 0
+            hash_[key] = value.encode() if isinstance(value, str) else value
+            return 1
+
+    def hmget(self, name, keys):
+        with self.lock:
+            hash_ = self.data.get(name, ({},))[0]
+            return [hash_.get(_text(k)) for k in keys]
+
+    def hdel(self, name, *keys):
+        with self.lock:
+            hash_ = self.data.get(name, ({},))[0]
+            return sum(hash_.pop(_text(k), None) is not None for k in keys)
+
+    def pipeline(self, transaction=True):
+        # Commands run right away; execute() has nothing left to send.
+        return self
+
+    def execute(self):
+        return []
+
+    def ping(self):
+        return True
+
+    def flushdb(self):
+        with self.lock:
+            self.data.clear()
+
+
+def connect(url):
+    if url == "memory://":
+        return MemoryRedis()
+    return redis.Redis.from_url(url)
+
+
+redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+redis_client = connect(redis_url)
+
+# Cached functions by name, for replaying recorded calls (see warmup.py).
+CACHED_FUNCTIONS = {}
+
+# With HOT_KEYS_SAMPLE > 0 (off by default), that share of the cached calls
+# made while serving requests is recorded for warmup.py: the score of the cache
+# key in the HOT_KEYS_ZSET sorted set goes up by one, and its function and
+# arguments are stored in the HOT_KEYS_ARGS hash. Samples are counted in
+# process and written in one pipeline every HOT_KEYS_FLUSH_SECONDS by a
+# background thread, so recording adds no Redis round trip to a request.
+# Point HOT_KEYS_URL at another Redis database than the cache, so that
+# flushing the cache keeps the hot set.
+HOT_KEYS_SAMPLE = float(os.getenv("HOT_KEYS_SAMPLE", "0"))
+HOT_KEYS_MAX = int(os.getenv("HOT_KEYS_MAX", "10000"))
+HOT_KEYS_FLUSH_SECONDS = float(os.getenv("HOT_KEYS_FLUSH_SECONDS", "5"))
+HOT_KEYS_ZSET = "hot_keys"
+HOT_KEYS_ARGS = "hot_keys:args"
+hot_keys_client = connect(os.getenv("HOT_KEYS_URL", redis_url))
+
+# Hit/miss counts of the request being served, see track_cache_stats().
+_request_stats = contextvars.ContextVar("cache_request_stats", default=None)
+
+
+def track_cache_stats():
+    """
+    Start counting cache hits and misses for the current context.
+
+    Call this at the start of a request; the returned dict is updated by every
+    cached call made while serving it, including calls in worker threads that
+    inherit the context.
+    """
+    stats = {"hits": 0, "misses": 0}
+    _request_stats.set(stats)
+    return stats
+
+
+# Samples not written yet: counts and the call of each cache key.
+_hot_lock = threading.Lock()
+_hot_counts = Counter()
+_hot_calls = {}
+_hot_flusher = None
+
+
+def record_hot_key(func_name, cache_key, kwargs):
+    # Only calls made for a request are traffic; prefetching, warm-up and
+    # other background callers run outside of track_cache_stats().
+    if HOT_KEYS_SAMPLE <= 0 or _request_stats.get() is None:
+        return
+    if random.random() >= HOT_KEYS_SAMPLE:
+        return
+    global _hot_flusher
+    with _hot_lock:
+        _hot_counts[cache_key] += 1
+        if cache_key not in _hot_calls:
+            _hot_calls[cache_key] = json.dumps({"func": func_name, "kwargs": kwargs})
+        if _hot_flusher is None:
+            _hot_flusher = threading.Thread(
+                target=_flush_hot_keys_forever, name="hot-keys", daemon=True
+            )
+            _hot_flusher.start()
+            atexit.register(flush_hot_keys)
+
+
+def _flush_hot_keys_forever():
+    while True:
+        time.sleep(HOT_KEYS_FLUSH_SECONDS)
+        flush_hot_keys()
+
+
+def flush_hot_keys():
+    """Write the buffered samples to Redis and trim the hot set."""
+    global _hot_counts, _hot_calls
+    with _hot_lock:
+        counts, calls = _hot_counts, _hot_calls
+        _hot_counts, _hot_calls = Counter(), {}
+    if not counts:
+        return
+    try:
+        pipe = hot_keys_client.pipeline(transaction=False)
+        for cache_key, count in counts.items():
+            pipe.zincrby(HOT_KEYS_ZSET, count, cache_key)
+            pipe.hsetnx(HOT_KEYS_ARGS, cache_key, calls[cache_key])
+        pipe.execute()
+        trim_hot_keys()
+    except Exception as e:
+        # Recording is best effort; the samples of this interval are lost.
+        print(f"Recording hot cache keys failed: {e!r}")
+
+
+def trim_hot_keys():
+    """Keep the HOT_KEYS_MAX highest scoring keys and their arguments."""
+    excess = hot_keys_client.zcard(HOT_KEYS_ZSET) - HOT_KEYS_MAX
+    if excess <= 0:
+        return
+    dropped = hot_keys_client.zrange(HOT_KEYS_ZSET, 0, excess - 1)
+    if dropped:
+        hot_keys_client.zrem(HOT_KEYS_ZSET, *dropped)
+        hot_keys_client.hdel(HOT_KEYS_ARGS, *dropped)
+
+
+def hot_keys(top):
+    """The `top` highest scoring recorded calls: (cache_key, score, func, kwargs)."""
+    entries = hot_keys_client.zrevrange(HOT_KEYS_ZSET, 0, top - 1, withscores=True)
+    if not entries:
+        return []
+    args = hot_keys_client.hmget(HOT_KEYS_ARGS, [key for key, _ in entries])
+    calls = []
+    for (key, score), call in zip(entries, args):
+        call = json.loads(call) if call else {"func": None, "kwargs": {}}
+        calls.append((key.decode(), score, call["func"], call["kwargs"]))
+    return calls
+
+
+def normalize_keyword(keyword):
+    """Lower case, single spaces: "Camera", " camera " and "CAMERA" are one query."""
+    return " ".join(keyword.lower().split())
+
+
+class SemanticCache:
+    """
+    Second cache tier for semantic searches: results of recent queries, found
+    by the query embedding. A query whose embedding is within `max_distance`
+    (cosine distance, as pgvector's <=>) of a cached query with the same
+    other arguments (the namespace) reuses that query's results.
+
+    The index is a flat matrix of at most `capacity` normalized embeddings,
+    searched with one matrix-vector product, next to the hash of every
+    entry's namespace. Entries expire after `ttl` seconds; when it is full
+    the least recently used entry is replaced. Every worker process has its
+    own.
+    """
+
+    def __init__(self, capacity=1024, max_distance=0.0, ttl=3600):
+        self.capacity = capacity
+        self.max_distance = max_distance
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.vectors = None
+        # The hash preselects entries; the namespace itself is compared on a hit.
+        self.namespace_hashes = np.zeros(capacity, dtype=np.int64)
+        self.namespaces = [None] * capacity
+        self.expires = np.zeros(capacity)
+        self.used = np.zeros(capacity, dtype=np.int64)
+        self.results = [None] * capacity
+        self.tick = 0
+
+    @property
+    def enabled(self):
+        return self.max_distance > 0
+
+    @staticmethod
+    def unit(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        return vector / np.linalg.norm(vector)
+
+    def get(self, namespace, vector):
+        if not self.enabled:
+            return None
+        vector = self.unit(vector)
+        with self.lock:
+            if self.vectors is None:
+                return None
+            live = (self.namespace_hashes == hash(namespace)) & (
+                self.expires > time.monotonic()
+            )
+            if not live.any():
+                return None
+            similarities = np.where(live, self.vectors @ vector, -np.inf)
+            i = int(np.argmax(similarities))
+            if (
+                1 - similarities[i] > self.max_distance
+                or self.namespaces[i] != namespace
+            ):
+                return None
+            self.tick += 1
+            self.used[i] = self.tick
+            return self.results[i]
+
+    def put(self, namespace, vector, result):
+        if not self.enabled:
+            return
+        vector = self.unit(vector)
+        with self.lock:
+            if self.vectors is None:
+                self.vectors = np.zeros((self.capacity, len(vector)), dtype=np.float32)
+            now = time.monotonic()
+            expired = np.flatnonzero(self.expires <= now)
+            i = int(expired[0]) if len(expired) else int(np.argmin(self.used))
+            self.tick += 1
+            self.vectors[i] = vector
+            self.namespace_hashes[i] = hash(namespace)
+            self.namespaces[i] = namespace
+            self.expires[i] = now + self.ttl
+            self.used[i] = self.tick
+            self.results[i] = result
+
+
+# SEMANTIC_CACHE_DISTANCE > 0 enables the semantic tier, e.g. 0.05. Results of
+# a query then stand in for those of similar queries, so it is off by default.
+semantic_cache = SemanticCache(
+    capacity=int(os.getenv("SEMANTIC_CACHE_SIZE", "1024")),
+    max_distance=float(os.getenv("SEMANTIC_CACHE_DISTANCE", "0")),
+)
+
+
+def semantic_lookup(func_name, namespace, vector):
+    """semantic_cache.get() counted as a cache request of `func_name`."""
+    if not semantic_cache.enabled:
+        return None
+    with stage("cache"):
+        result = semantic_cache.get(namespace, vector)
+    CACHE_REQUESTS.inc(
+        func_name, "semantic_hit" if result is not None else "semantic_miss"
+    )
+    stats = _request_stats.get()
+    if result is not None and stats is not None:
+        stats["hits"] += 1
+    return result
 
 
 def cache(cache_keys=None, expire_time=3600):
@@ -37,22 +373,33 @@ def cache(cache_keys=None, expire_time=3600):
             cache_key = hashlib.md5(
                 json.dumps(cache_dict, sort_keys=True).encode()
             ).hexdigest()
+            record_hot_key(func.__name__, cache_key, cache_dict["kwargs"])
 
             # Try to get cached result
-            cached_result = redis_client.get(cache_key)
+            with stage("cache"):
+                cached_result = redis_client.get(cache_key)
+                if cached_result:
+                    result = json.loads(cached_result)
+            stats = _request_stats.get()
             if cached_result:
-                print(f"Method {func.__name__}. Cache hit.")
-                return json.loads(cached_result)
+                CACHE_REQUESTS.inc(func.__name__, "hit")
+                if stats is not None:
+                    stats["hits"] += 1
+                return result
 
             # Calculate result if not cached
             result = func(*args, **kwargs)
-            print(f"Method {func.__name__}. Cache miss.")
+            CACHE_REQUESTS.inc(func.__name__, "miss")
+            if stats is not None:
+                stats["misses"] += 1
 
             # Cache the result
-            redis_client.setex(cache_key, expire_time, json.dumps(result))
+            with stage("cache"):
+                redis_client.setex(cache_key, expire_time, json.dumps(result))
 
             return result
 
+        CACHED_FUNCTIONS[func.__name__] = wrapper
         return wrapper
 
     return decorator
@@ -0,0 +1,283 @@
+"""
+In-memory product catalog: product id -> {name, product_id, amazon_id}.
+
+The catalog keeps every product in a few flat arrays instead of millions of
+Python objects: a sorted int64 id array (looked up with a binary search) and
+the UTF-8 bytes of all names and amazon ids packed into one buffer each, with
+an offsets array per column. A lookup of k ids costs one searchsorted call
+and k slices.
+
+Catalog loads in the background and then polls the product_changes log
+(scripts/import_to_pgsql.py) for ids changed since its last refresh, re-reads
+only those rows and merges them into a new snapshot. Readers always see a
+complete snapshot. Without the change log it reloads everything every
+CATALOG_FULL_RELOAD_SECONDS instead.
+
+The log is read in commit order, not by its sequence: sequence values are
+taken when a row is inserted, so a transaction that commits late can add
+entries below ones that were already read. Every entry records the id of its
+transaction, and the position in the log is the xmin of a snapshot, below
+which every transaction has finished. A refresh reads the entries from the
+last position up to the current one, so each entry is read exactly once,
+after its transaction has committed.
+
+Entries older than CATALOG_CHANGES_RETENTION_SECONDS are deleted by the
+catalogs; one that has not refreshed for half that time reloads everything.
+"""
+
+import os
+import threading
+import time
+
+import numpy as np
+import psycopg
+
+CATALOG_REFRESH_SECONDS = float(os.getenv("CATALOG_REFRESH_SECONDS", "10"))
+CATALOG_FULL_RELOAD_SECONDS = float(os.getenv("CATALOG_FULL_RELOAD_SECONDS", "600"))
+CATALOG_CHANGES_RETENTION_SECONDS = float(
+    os.getenv("CATALOG_CHANGES_RETENTION_SECONDS", "86400")
+)
+CATALOG_PRUNE_SECONDS = float(os.getenv("CATALOG_PRUNE_SECONDS", "600"))
+
+SQL_COPY_PRODUCTS = "COPY (SELECT product_id, name, amazon_id FROM products) TO STDOUT"
+SQL_SELECT_PRODUCTS = (
+    "SELECT product_id, name, amazon_id FROM products WHERE product_id = ANY(%s)"
+)
+# Positions are xid8 values, passed around as text. One statement reads the
+# new position and the entries below it, so both come from the same snapshot.
+SQL_LOG_POSITION = """
+SELECT pg_snapshot_xmin(pg_current_snapshot())::text
+WHERE to_regclass('product_changes') IS NOT NULL
+"""
+SQL_CHANGES_SINCE = """
+SELECT
+    pg_snapshot_xmin(pg_current_snapshot())::text,
+    array(
+        SELECT DISTINCT product_id FROM product_changes
+        WHERE txid >= %s::xid8 AND txid < pg_snapshot_xmin(pg_current_snapshot())
+    )
+"""
+SQL_PRUNE_CHANGES = """
+DELETE FROM product_changes
+WHERE changed_at < now() - make_interval(secs => %s)
+    AND txid < pg_snapshot_xmin(pg_current_snapshot())
+"""
+
+
+def pack(values):
+    """Pack strings (None allowed) into a byte buffer, offsets and a null mask."""
+    encoded = [b"" if v is None else v.encode() for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    nulls = np.array([v is None for v in values], dtype=bool)
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets, nulls
+
+
+def gather(buffer, offsets, index):
+    """The packed strings at `index`, as a new buffer and offsets."""
+    lengths = (offsets[1:] - offsets[:-1])[index]
+    new_offsets = np.zeros(len(index) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=new_offsets[1:])
+    shift = np.repeat(offsets[:-1][index] - new_offsets[:-1], lengths)
+    source = shift + np.arange(new_offsets[-1])
+    return buffer[source], new_offsets
+
+
+class PackedColumn:
+    def __init__(self, buffer, offsets, nulls):
+        self.buffer = buffer
+        self.offsets = offsets
+        self.nulls = nulls
+
+    @classmethod
+    def from_values(cls, values):
+        return cls(*pack(values))
+
+    def __getitem__(self, i):
+        if self.nulls[i]:
+            return None
+        return self.buffer[self.offsets[i] : self.offsets[i + 1]].tobytes().decode()
+
+    def take(self, index):
+        buffer, offsets = gather(self.buffer, self.offsets, index)
+        return PackedColumn(buffer, offsets, self.nulls[index])
+
+    @staticmethod
+    def concat(a, b):
+        return PackedColumn(
+            np.concatenate([a.buffer, b.buffer]),
+            np.concatenate([a.offsets[:-1], b.offsets + a.offsets[-1]]),
+            np.concatenate([a.nulls, b.nulls]),
+        )
+
+    @property
+    def nbytes(self):
+        return self.buffer.nbytes + self.offsets.nbytes + self.nulls.nbytes
+
+
+class CatalogSnapshot:
+    """An immutable catalog; updates build a new snapshot."""
+
+    def __init__(self, ids, names, amazon_ids):
+        self.ids = ids
+        self.names = names
+        self.amazon_ids = amazon_ids
+
+    @classmethod
+    def from_rows(cls, rows):
+        rows = sorted(rows, key=lambda row: row[0])
+        return cls(
+            np.array([row[0] for row in rows], dtype=np.int64),
+            PackedColumn.from_values([row[1] for row in rows]),
+            PackedColumn.from_values([row[2] for row in rows]),
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nbytes(self):
+        return self.ids.nbytes + self.names.nbytes + self.amazon_ids.nbytes
+
+    def positions(self, product_ids):
+        """Index of every id in the arrays, or -1 if it is not in the catalog."""
+        product_ids = np.asarray(product_ids, dtype=np.int64)
+        if len(self.ids) == 0:
+            return np.full(len(product_ids), -1)
+        positions = np.searchsorted(self.ids, product_ids)
+        positions[positions == len(self.ids)] = 0
+        return np.where(self.ids[positions] == product_ids, positions, -1)
+
+    def row(self, i):
+        return {
+            "name": self.names[i],
+            "product_id": int(self.ids[i]),
+            "amazon_id": self.amazon_ids[i],
+        }
+
+    def merge(self, rows, removed_ids):
+        """A new snapshot with `rows` upserted and `removed_ids` deleted."""
+        replaced = np.array(
+            [row[0] for row in rows] + list(removed_ids), dtype=np.int64
+        )
+        keep = np.flatnonzero(~np.isin(self.ids, replaced))
+        added = CatalogSnapshot.from_rows(rows)
+        ids = np.concatenate([self.ids[keep], added.ids])
+        names = PackedColumn.concat(self.names.take(keep), added.names)
+        amazon_ids = PackedColumn.concat(
+            self.amazon_ids.take(keep), added.amazon_ids
+        )
+        order = np.argsort(ids, kind="stable")
+        return CatalogSnapshot(ids[order], names.take(order), amazon_ids.take(order))
+
+
+def load_all(conn):
+    with conn.cursor() as cur, cur.copy(SQL_COPY_PRODUCTS) as copy:
+        copy.set_types(["int4", "text", "text"])
+        return CatalogSnapshot.from_rows(list(copy.rows()))
+
+
+class Catalog:
+    """
+    Background-loaded, incrementally refreshed catalog. lookup() returns None
+    for every id until the first load has finished.
+    """
+
+    def __init__(self, db_url):
+        self.db_url = db_url
+        self.snapshot = None
+        self.log_position = None
+        self.loaded_at = None
+        self.refreshed_at = None
+        self.pruned_at = None
+        self.error = None
+        self.stopped = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self.run, name="catalog", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                with psycopg.connect(self.db_url, autocommit=True) as conn:
+                    if self.snapshot is None or self.reload_due():
+                        self.reload(conn)
+                    while not self.stopped.wait(CATALOG_REFRESH_SECONDS):
+                        if self.reload_due():
+                            self.reload(conn)
+                        else:
+                            self.refresh(conn)
+            except Exception as e:
+                # Keep serving the last snapshot and try again later.
+                self.error = repr(e)
+                print(f"Catalog refresh failed: {self.error}")
+                self.stopped.wait(CATALOG_REFRESH_SECONDS)
+
+    def reload_due(self):
+        if self.log_position is None:
+            return time.monotonic() - self.loaded_at > CATALOG_FULL_RELOAD_SECONDS
+        # Entries it has not read yet may have been pruned by now.
+        return (
+            time.monotonic() - self.refreshed_at > CATALOG_CHANGES_RETENTION_SECONDS / 2
+        )
+
+    def change_log_position(self, conn):
+        row = conn.execute(SQL_LOG_POSITION).fetchone()
+        return row[0] if row else None
+
+    def reload(self, conn):
+        start = time.perf_counter()
+        # Read the log position first: changes made during the load are then
+        # applied again by the next refresh, never missed.
+        log_position = self.change_log_position(conn)
+        snapshot = load_all(conn)
+        self.snapshot, self.log_position = snapshot, log_position
+        self.loaded_at = self.refreshed_at = time.monotonic()
+        self.error = None
+        print(
+            f"Catalog loaded {len(snapshot)} products "
+            f"({snapshot.nbytes / 2**20:.1f} MiB) in {time.perf_counter() - start:.1f}s."
+        )
+
+    def refresh(self, conn):
+        if self.log_position is None:
+            return
+        log_position, changed = conn.execute(
+            SQL_CHANGES_SINCE, (self.log_position,)
+        ).fetchone()
+        if changed:
+            rows = conn.execute(SQL_SELECT_PRODUCTS, (changed,)).fetchall()
+            removed = set(changed) - {row[0] for row in rows}
+            self.snapshot = self.snapshot.merge(rows, removed)
+        self.log_position = log_position
+        self.refreshed_at = time.monotonic()
+        self.error = None
+        if (
+            self.pruned_at is None
+            or self.refreshed_at - self.pruned_at > CATALOG_PRUNE_SECONDS
+        ):
+            conn.execute(SQL_PRUNE_CHANGES, (CATALOG_CHANGES_RETENTION_SECONDS,))
+            self.pruned_at = self.refreshed_at
+
+    def lookup(self, product_ids):
+        """One {name, product_id, amazon_id} dict or None per id."""
+        snapshot = self.snapshot
+        if snapshot is None:
+            return [None] * len(product_ids)
+        return [
+            snapshot.row(i) if i >= 0 else None
+            for i in snapshot.positions(product_ids).tolist()
+        ]
+
+    def status(self):
+        snapshot = self.snapshot
+        return {
+            "products": len(snapshot) if snapshot is not None else None,
+            "bytes": snapshot.nbytes if snapshot is not None else None,
+            "incremental": self.log_position is not None,
+            "error": self.error,
+        }
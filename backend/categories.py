@@ -0,0 +1,206 @@
+"""
+In-memory category index: category id -> set of product ids, for filtering
+search results by category.
+
+Each category is a compressed bitmap of its product ids: a pyroaring BitMap
+when pyroaring is installed (`pip install .[categories]`), otherwise a
+sorted uint32 array. A filtered search ranks candidates without the filter,
+over-fetching more of them when too few survive, and keeps the ones whose id
+is in the union of the requested categories' bitmaps. If that still leaves
+too few, the search is run again with the filter applied by the search
+backend itself.
+
+CategoryIndex loads product_categories in the background and reloads it
+every CATEGORY_RELOAD_SECONDS; categories change rarely.
+"""
+
+import os
+import threading
+import time
+
+import numpy as np
+import psycopg
+
+try:
+    from pyroaring import BitMap
+except ImportError:
+    BitMap = None
+
+CATEGORY_RELOAD_SECONDS = float(os.getenv("CATEGORY_RELOAD_SECONDS", "600"))
+# The first filtered page fetches top_k * CATEGORY_OVERFETCH candidates, and
+# every retry CATEGORY_OVERFETCH times more, up to CATEGORY_MAX_CANDIDATES.
+CATEGORY_OVERFETCH = int(os.getenv("CATEGORY_OVERFETCH", "4"))
+CATEGORY_MAX_CANDIDATES = int(os.getenv("CATEGORY_MAX_CANDIDATES", "1000"))
+
+SQL_SELECT_CATEGORIES = "SELECT category_id, category FROM categories"
+SQL_COPY_PRODUCT_CATEGORIES = (
+    "COPY (SELECT category_id, product_id FROM product_categories"
+    " ORDER BY category_id, product_id) TO STDOUT"
+)
+
+
+class SortedIds:
+    """Sorted uint32 array with the part of the BitMap interface used here."""
+
+    def __init__(self, ids):
+        self.ids = np.asarray(ids, dtype=np.uint32)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @staticmethod
+    def union(*sets):
+        if not sets:
+            return SortedIds([])
+        return SortedIds(np.unique(np.concatenate([s.ids for s in sets])))
+
+    def contains(self, product_ids):
+        """A bool per id in `product_ids`."""
+        product_ids = np.asarray(product_ids, dtype=np.int64)
+        if len(self.ids) == 0:
+            return np.zeros(len(product_ids), dtype=bool)
+        positions = np.searchsorted(self.ids, product_ids)
+        positions[positions == len(self.ids)] = 0
+        return self.ids[positions] == product_ids
+
+    def __iter__(self):
+        return iter(self.ids.tolist())
+
+    @property
+    def nbytes(self):
+        return self.ids.nbytes
+
+
+def make_bitmap(sorted_ids):
+    if BitMap is None:
+        return SortedIds(sorted_ids)
+    bitmap = BitMap(sorted_ids.tolist())
+    bitmap.run_optimize()
+    return bitmap
+
+
+def union(bitmaps):
+    if BitMap is None:
+        return SortedIds.union(*bitmaps)
+    return BitMap.union(*bitmaps) if bitmaps else BitMap()
+
+
+def contains(bitmap, product_ids):
+    if BitMap is None:
+        return bitmap.contains(product_ids).tolist()
+    # BitMap only takes ints; ids may come in as strings or numpy integers.
+    return [int(pid) in bitmap for pid in product_ids]
+
+
+def bitmap_nbytes(bitmap):
+    if BitMap is None:
+        return bitmap.nbytes
+    return len(bitmap.serialize())
+
+
+def overfetch(search, product_id_of, members, top_k, fallback=None):
+    """
+    The first `top_k` results of `search` whose product id is in `members`.
+
+    `search(n)` returns the best n results in rank order. It is called again
+    with CATEGORY_OVERFETCH times more candidates while too few of them are
+    members, until it returns fewer than asked for (no more candidates) or
+    CATEGORY_MAX_CANDIDATES is reached. In the latter case, which happens for
+    categories with a small share of the products, the result of
+    `fallback()`, a search that filters by itself, is returned if given.
+    """
+    if len(members) == 0:
+        return []
+    fetch = min(top_k * CATEGORY_OVERFETCH, CATEGORY_MAX_CANDIDATES)
+    while True:
+        candidates = search(fetch)
+        keep = contains(members, [product_id_of(c) for c in candidates])
+        results = [c for c, k in zip(candidates, keep) if k]
+        if len(results) >= top_k or len(candidates) < fetch:
+            return results[:top_k]
+        if fetch >= CATEGORY_MAX_CANDIDATES:
+            return fallback() if fallback else results
+        fetch = min(fetch * CATEGORY_OVERFETCH, CATEGORY_MAX_CANDIDATES)
+
+
+class CategoryIndex:
+    """
+    Background-loaded category bitmaps. members() returns None until the
+    first load has finished.
+    """
+
+    def __init__(self, db_url):
+        self.db_url = db_url
+        self.names = None
+        self.bitmaps = None
+        self.loaded_at = None
+        self.error = None
+        self.stopped = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self.run, name="categories", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                with psycopg.connect(self.db_url, autocommit=True) as conn:
+                    self.reload(conn)
+            except Exception as e:
+                # Keep serving the last bitmaps and try again later.
+                self.error = repr(e)
+                print(f"Category index load failed: {self.error}")
+            self.stopped.wait(CATEGORY_RELOAD_SECONDS)
+
+    def reload(self, conn):
+        start = time.perf_counter()
+        names = dict(conn.execute(SQL_SELECT_CATEGORIES).fetchall())
+        with conn.cursor() as cur, cur.copy(SQL_COPY_PRODUCT_CATEGORIES) as copy:
+            copy.set_types(["int4", "int4"])
+            pairs = np.array(list(copy.rows()), dtype=np.int64).reshape(-1, 2)
+        # Rows are sorted by category, so every category is one slice.
+        category_ids, starts = np.unique(pairs[:, 0], return_index=True)
+        ends = np.append(starts[1:], len(pairs))
+        bitmaps = {
+            int(category_id): make_bitmap(pairs[s:e, 1])
+            for category_id, s, e in zip(category_ids, starts, ends)
+        }
+        self.names, self.bitmaps = names, bitmaps
+        self.loaded_at = time.monotonic()
+        self.error = None
+        print(
+            f"Category index loaded {len(bitmaps)} categories, {len(pairs)} links "
+            f"({self.nbytes / 2**20:.1f} MiB) in {time.perf_counter() - start:.1f}s."
+        )
+
+    @property
+    def nbytes(self):
+        return sum(bitmap_nbytes(b) for b in (self.bitmaps or {}).values())
+
+    def members(self, category_ids):
+        """Union of the bitmaps of `category_ids`; unknown ids are empty."""
+        bitmaps = self.bitmaps
+        if bitmaps is None:
+            return None
+        return union([bitmaps[c] for c in set(category_ids) if c in bitmaps])
+
+    def categories(self):
+        bitmaps = self.bitmaps or {}
+        return [
+            {
+                "category_id": category_id,
+                "category": name,
+                "products": len(bitmaps.get(category_id, ())),
+            }
+            for category_id, name in sorted((self.names or {}).items())
+        ]
+
+    def status(self):
+        return {
+            "categories": len(self.bitmaps) if self.bitmaps is not None else None,
+            "bitmap": "roaring" if BitMap is not None else "sorted-array",
+            "error": self.error,
+        }
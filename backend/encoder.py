@@ -0,0 +1,265 @@
+"""
+Text encoders used for semantic search.
+
+ENCODER selects the implementation:
+
+- "sentence-transformers" (default): the model in ENCODER_MODEL ("./model"),
+  on the GPU when one is available.
+- "onnx": the same model exported to ONNX with dynamic int8 quantization
+  into ENCODER_ONNX_MODEL ("./model-onnx", see export_onnx.py), run by
+  onnxruntime on the CPU with ENCODER_THREADS intra-op threads. Query
+  vectors stay compatible with the stored embeddings;
+  `python export_onnx.py check` measures how close they are.
+- "fake": FakeEncoder, a deterministic stand-in with the same interface and
+  dimensions that needs neither the model files nor torch. Texts sharing words
+  get similar vectors, so semantic search still returns plausible results on
+  synthetic data (see scripts/generate_dataset.py).
+- "remote": RemoteEncoder, a client of the encoder sidecar
+  (encoder_server.py) on ENCODER_SOCKET, so that several worker processes
+  share one model (see serve.py).
+- "none": no encoder. Nothing heavy is imported; semantic search is refused.
+
+torch, sentence_transformers and onnxruntime are only imported when their
+encoder is loaded. BackgroundEncoder loads and warms up the encoder in a
+thread so that the server can start serving everything else right away.
+"""
+
+import hashlib
+import os
+import re
+import threading
+import time
+from functools import lru_cache
+
+import numpy as np
+
+EMBEDDING_DIMS = 1536
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+@lru_cache(maxsize=65536)
+def _token_vector(token, dims):
+    seed = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest())
+    return np.random.default_rng(seed).standard_normal(dims, dtype=np.float32)
+
+
+class FakeEncoder:
+    """
+    Deterministic bag-of-words encoder with the SentenceTransformer interface.
+
+    Every word maps to a fixed random vector (seeded by its hash); a text is
+    the normalized sum of its words. The same text always gives the same
+    vector, across processes and machines.
+    """
+
+    prompts = {"query": ""}
+
+    def __init__(self, dims=EMBEDDING_DIMS):
+        self.dims = dims
+
+    def get_sentence_embedding_dimension(self):
+        return self.dims
+
+    def to(self, device):
+        return self
+
+    def encode_one(self, text):
+        tokens = _TOKEN_RE.findall(text.lower()) or [""]
+        vector = np.sum([_token_vector(t, self.dims) for t in tokens], axis=0)
+        return vector / np.linalg.norm(vector)
+
+    def encode(self, sentences, prompt_name=None, batch_size=32, **kwargs):
+        if prompt_name is not None and prompt_name not in self.prompts:
+            raise ValueError(
+                f"Prompt name '{prompt_name}' not found in the configured prompts: {list(self.prompts)}"
+            )
+        if isinstance(sentences, str):
+            return self.encode_one(sentences)
+        if not sentences:
+            return np.empty((0, self.dims), dtype=np.float32)
+        return np.stack([self.encode_one(s) for s in sentences])
+
+
+def load_sentence_transformer(path):
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(path, trust_remote_code=True)
+    if torch.cuda.is_available():
+        model = model.to("cuda")
+    return model
+
+
+# Written by export_onnx.py; the suffix names the quantization target.
+DEFAULT_ONNX_MODEL = "./model-onnx"
+ONNX_FILE_NAME = "onnx/model_qint8_avx512_vnni.onnx"
+
+
+def load_onnx(path, file_name=ONNX_FILE_NAME, threads=None):
+    import onnxruntime as ort
+    from sentence_transformers import SentenceTransformer
+
+    options = ort.SessionOptions()
+    # One query at a time: parallelism inside operators, none between them.
+    options.intra_op_num_threads = threads or os.cpu_count()
+    options.inter_op_num_threads = 1
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return SentenceTransformer(
+        path,
+        backend="onnx",
+        device="cpu",
+        trust_remote_code=True,
+        model_kwargs={
+            "file_name": file_name,
+            "provider": "CPUExecutionProvider",
+            "session_options": options,
+        },
+    )
+
+
+DEFAULT_SOCKET = "/tmp/backend-encoder.sock"
+
+
+class RemoteEncoder:
+    """
+    encode() through the encoder sidecar. Each thread has its own connection,
+    as a multiprocessing Connection must not be shared between threads.
+    """
+
+    def __init__(self, address, authkey=None, connect_timeout=600):
+        self.address = address
+        self.authkey = authkey
+        self.local = threading.local()
+        # The sidecar may still be loading the model; wait for its socket.
+        deadline = time.monotonic() + connect_timeout
+        while True:
+            try:
+                self.status = self.request(("status",))
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.5)
+
+    def connection(self):
+        from multiprocessing.connection import Client
+
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = Client(
+                self.address, family="AF_UNIX", authkey=self.authkey
+            )
+        return conn
+
+    def request(self, message):
+        for attempt in range(2):
+            conn = self.connection()
+            try:
+                conn.send(message)
+                status, result = conn.recv()
+                break
+            except (EOFError, OSError):
+                # The sidecar restarted or dropped the connection; retry once.
+                self.local.conn = None
+                conn.close()
+                if attempt:
+                    raise
+        if status == "error":
+            raise RuntimeError(f"Encoder sidecar: {result}")
+        return result
+
+    def encode(self, sentences, prompt_name=None, **kwargs):
+        if isinstance(sentences, str):
+            return self.request(("encode", [sentences], prompt_name))[0]
+        return self.request(("encode", list(sentences), prompt_name))
+
+
+ENCODERS = ["sentence-transformers", "onnx", "remote", "fake", "none"]
+
+
+def load_encoder(name=None):
+    name = name or os.getenv("ENCODER", "sentence-transformers")
+    path = os.getenv("ENCODER_MODEL", "./model")
+    if name == "sentence-transformers":
+        return load_sentence_transformer(path)
+    if name == "onnx":
+        threads = os.getenv("ENCODER_THREADS")
+        return load_onnx(
+            os.getenv("ENCODER_ONNX_MODEL", DEFAULT_ONNX_MODEL),
+            os.getenv("ENCODER_ONNX_FILE", ONNX_FILE_NAME),
+            int(threads) if threads else None,
+        )
+    if name == "remote":
+        authkey = os.getenv("ENCODER_AUTHKEY", "").encode() or None
+        return RemoteEncoder(os.getenv("ENCODER_SOCKET", DEFAULT_SOCKET), authkey)
+    if name == "fake":
+        return FakeEncoder()
+    if name == "none":
+        return None
+    raise ValueError(f"Unknown encoder {name!r}, expected one of {ENCODERS}")
+
+
+# Queries encoded once after loading; the first calls of a model are much
+# slower than the rest (lazy initialization, memory allocation, JIT).
+WARMUP_QUERIES = ["warmup", "digital camera", "wireless noise cancelling headphones"]
+
+
+class EncoderUnavailable(Exception):
+    def __init__(self, state, error=None):
+        self.state = state
+        self.error = error
+        super().__init__(f"encoder is {state}" + (f": {error}" if error else ""))
+
+
+class BackgroundEncoder:
+    """
+    Loads the encoder in a background thread and reports its state:
+    "pending", "loading", "warming_up", "ready", "failed" or "disabled".
+    encode() raises EncoderUnavailable until the state is "ready".
+    """
+
+    def __init__(self, name=None):
+        self.name = name or os.getenv("ENCODER", "sentence-transformers")
+        self.state = "disabled" if self.name == "none" else "pending"
+        self.model = None
+        self.error = None
+        self.load_seconds = None
+        self.ready = threading.Event()
+
+    def start(self):
+        if self.state == "pending":
+            self.state = "loading"
+            threading.Thread(target=self.load, name="encoder-loader", daemon=True).start()
+        return self
+
+    def load(self):
+        start = time.perf_counter()
+        try:
+            model = load_encoder(self.name)
+            self.state = "warming_up"
+            model.encode(WARMUP_QUERIES, prompt_name="query")
+        except Exception as e:
+            self.error = repr(e)
+            self.state = "failed"
+            print(f"Encoder {self.name} failed to load: {self.error}")
+            return
+        self.model = model
+        self.load_seconds = time.perf_counter() - start
+        self.state = "ready"
+        self.ready.set()
+        print(f"Encoder {self.name} ready in {self.load_seconds:.1f}s.")
+
+    def status(self):
+        return {
+            "encoder": self.name,
+            "state": self.state,
+            "error": self.error,
+            "load_seconds": self.load_seconds,
+        }
+
+    def encode(self, sentences, prompt_name=None, **kwargs):
+        if self.state != "ready":
+            raise EncoderUnavailable(self.state, self.error)
+        return self.model.encode(sentences, prompt_name=prompt_name, **kwargs)
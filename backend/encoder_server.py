@@ -0,0 +1,133 @@
+"""
+Encoder sidecar: one process holds the model and encodes for all workers.
+
+Workers connect over a Unix socket with multiprocessing.connection and use
+encoder.RemoteEncoder, which has the same encode() interface as the local
+models. Requests that arrive together are encoded as one batch, so N workers
+cost one model in memory and batched inference instead of N models competing
+for the same cores. serve.py starts it together with the uvicorn workers.
+
+    python encoder_server.py --socket /tmp/encoder.sock
+"""
+
+import argparse
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener
+
+from encoder import DEFAULT_SOCKET, WARMUP_QUERIES, load_encoder
+
+# Largest batch encoded at once, and how long the first request of a batch
+# waits for others to join it.
+MAX_BATCH = int(os.getenv("ENCODER_MAX_BATCH", "32"))
+BATCH_WAIT_SECONDS = float(os.getenv("ENCODER_BATCH_WAIT_MS", "2")) / 1000
+
+
+class Batcher:
+    """Collects encode requests from all connections into batches."""
+
+    def __init__(self, model):
+        self.model = model
+        self.requests = queue.Queue()
+        threading.Thread(target=self.run, name="encoder-batcher", daemon=True).start()
+
+    def submit(self, sentences, prompt_name):
+        future = Future()
+        self.requests.put((sentences, prompt_name, future))
+        return future
+
+    def next_batch(self):
+        batch = [self.requests.get()]
+        deadline = time.perf_counter() + BATCH_WAIT_SECONDS
+        size = len(batch[0][0])
+        while size < MAX_BATCH:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=timeout))
+            except queue.Empty:
+                break
+            size += len(batch[-1][0])
+        return batch
+
+    def run(self):
+        while True:
+            batch = self.next_batch()
+            # Different prompts cannot share a forward pass.
+            by_prompt = {}
+            for request in batch:
+                by_prompt.setdefault(request[1], []).append(request)
+            for prompt_name, requests in by_prompt.items():
+                sentences = [s for r in requests for s in r[0]]
+                try:
+                    vectors = self.model.encode(sentences, prompt_name=prompt_name)
+                except Exception as e:
+                    for r in requests:
+                        r[2].set_exception(e)
+                    continue
+                start = 0
+                for r in requests:
+                    r[2].set_result(vectors[start : start + len(r[0])])
+                    start += len(r[0])
+
+
+def handle(conn, batcher, status):
+    with conn:
+        while True:
+            try:
+                message = conn.recv()
+            except EOFError:
+                return
+            if message[0] == "status":
+                conn.send(("ok", status))
+                continue
+            _, sentences, prompt_name = message
+            try:
+                conn.send(("ok", batcher.submit(sentences, prompt_name).result()))
+            except Exception as e:
+                conn.send(("error", repr(e)))
+
+
+def serve(address, authkey, name=None):
+    start = time.perf_counter()
+    model = load_encoder(name)
+    if model is None:
+        raise ValueError("The encoder sidecar needs an encoder, not ENCODER=none")
+    model.encode(WARMUP_QUERIES, prompt_name="query")
+    status = {"encoder": name or os.getenv("ENCODER"), "pid": os.getpid()}
+    batcher = Batcher(model)
+
+    if os.path.exists(address):
+        os.unlink(address)
+    with Listener(address, family="AF_UNIX", authkey=authkey) as listener:
+        elapsed = time.perf_counter() - start
+        print(f"Encoder sidecar ready on {address} in {elapsed:.1f}s.")
+        while True:
+            try:
+                conn = listener.accept()
+            except (AuthenticationError, OSError) as e:
+                print(f"Encoder sidecar rejected a connection: {e!r}")
+                continue
+            threading.Thread(
+                target=handle, args=(conn, batcher, status), daemon=True
+            ).start()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Encoder sidecar")
+    parser.add_argument(
+        "--socket", default=os.getenv("ENCODER_SOCKET", DEFAULT_SOCKET)
+    )
+    parser.add_argument(
+        "--encoder",
+        default=os.getenv("ENCODER_SIDECAR", "sentence-transformers"),
+        help="encoder loaded by the sidecar (sentence-transformers, onnx or fake)",
+    )
+    args = parser.parse_args()
+    authkey = os.getenv("ENCODER_AUTHKEY", "").encode() or None
+    serve(args.socket, authkey, args.encoder)
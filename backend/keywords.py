@@ -0,0 +1,11 @@
+"""Sample search keywords for load_test.py and export_onnx.py check."""
+
+SAMPLE_KEYWORDS = [
+    "camera", "digital camera", "headphones", "wireless headphones", "laptop",
+    "laptop bag", "phone case", "charger", "usb cable", "keyboard", "mouse",
+    "monitor", "speaker", "bluetooth speaker", "watch", "smart watch",
+    "book", "novel", "cookbook", "coffee maker", "blender", "toaster",
+    "vacuum", "shoes", "running shoes", "backpack", "tent", "lamp",
+    "desk", "chair", "toy", "lego", "board game", "guitar", "printer",
+    "router", "hard drive", "memory card", "tripod", "lens",
+]
@@ -0,0 +1,252 @@
+"""
+HTTP load generator for the backend endpoints.
+
+Drives a weighted mix of /search (psql/elastic, exact/semantic), /ratings and
+/recommend requests from concurrent clients. Keywords are drawn uniformly or
+from a Zipf-like distribution, so popular keywords repeat and exercise the
+Redis cache. Reports requests per second, latency percentiles, error rates
+and cache hit ratios (from the X-Cache-Hits / X-Cache-Misses headers) per
+request type.
+
+    python load_test.py --concurrency 16 --duration 60
+    python load_test.py --mix search_psql_semantic=1 --distribution zipf --zipf-s 1.2
+    python load_test.py --keywords keywords.txt --json load.json
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+import requests
+
+from keywords import SAMPLE_KEYWORDS
+
+BASE_URL = "http://localhost:8000"
+
+DEFAULT_MIX = {
+    "search_psql_semantic": 4,
+    "search_psql_exact": 2,
+    "search_elastic_semantic": 1,
+    "search_elastic_exact": 1,
+    "search_comments": 1,
+    "ratings": 2,
+    "recommend": 1,
+}
+
+
+class Workload:
+    """Draws keywords and ids for requests, with a per-worker random state."""
+
+    def __init__(self, args, seed):
+        self.rng = random.Random(seed)
+        self.args = args
+        ranks = np.arange(1, len(args.keywords) + 1)
+        if args.distribution == "zipf":
+            weights = 1.0 / ranks**args.zipf_s
+        else:
+            weights = np.ones(len(ranks))
+        self.keyword_weights = np.cumsum(weights).tolist()
+        self.request_types = list(args.mix)
+        self.request_weights = np.cumsum(list(args.mix.values())).tolist()
+
+    def keyword(self):
+        return self.rng.choices(self.args.keywords, cum_weights=self.keyword_weights)[0]
+
+    def product_id(self):
+        return self.rng.randint(*self.args.product_ids)
+
+    def user_id(self):
+        return self.rng.randint(*self.args.user_ids)
+
+    def request_type(self):
+        return self.rng.choices(self.request_types, cum_weights=self.request_weights)[0]
+
+
+def search_request(backend: str, exact: bool, comments: bool = False):
+    def send(session: requests.Session, base_url: str, w: Workload):
+        return session.post(
+            f"{base_url}/search",
+            params={
+                "keyword": w.keyword(),
+                "exact": exact,
+                "product_id": w.product_id() if comments else -1,
+                "backend": backend,
+                "top_k": w.args.top_k,
+            },
+        )
+
+    return send
+
+
+def ratings_request(session: requests.Session, base_url: str, w: Workload):
+    return session.get(
+        f"{base_url}/ratings",
+        params={"product_id": w.product_id(), "top_k": w.args.top_k},
+    )
+
+
+def recommend_request(session: requests.Session, base_url: str, w: Workload):
+    return session.post(
+        f"{base_url}/recommend",
+        json={
+            "user_id": w.user_id(),
+            "method": w.rng.choice(["related", "related_embedding", "embedding"]),
+            "top_k": 5,
+        },
+    )
+
+
+REQUESTS: Dict[str, Callable[..., requests.Response]] = {
+    "search_psql_semantic": search_request("psql", exact=False),
+    "search_psql_exact": search_request("psql", exact=True),
+    "search_elastic_semantic": search_request("elastic", exact=False),
+    "search_elastic_exact": search_request("elastic", exact=True),
+    "search_comments": search_request("psql", exact=False, comments=True),
+    "ratings": ratings_request,
+    "recommend": recommend_request,
+}
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.records: Dict[str, List[tuple]] = {}
+
+    def add(self, request_type, latency, ok, hits, misses):
+        with self.lock:
+            self.records.setdefault(request_type, []).append(
+                (latency, ok, hits, misses)
+            )
+
+
+def worker(args, index, deadline, recorder):
+    w = Workload(args, args.seed + index)
+    with requests.Session() as session:
+        while time.perf_counter() < deadline:
+            request_type = w.request_type()
+            start = time.perf_counter()
+            try:
+                response = REQUESTS[request_type](session, args.base_url, w)
+                ok = response.status_code < 400
+                hits = int(response.headers.get("X-Cache-Hits", 0))
+                misses = int(response.headers.get("X-Cache-Misses", 0))
+            except requests.RequestException:
+                ok, hits, misses = False, 0, 0
+            recorder.add(request_type, time.perf_counter() - start, ok, hits, misses)
+
+
+def summarize(records, elapsed) -> Dict[str, Any]:
+    latencies = np.array([r[0] for r in records])
+    errors = sum(1 for r in records if not r[1])
+    hits = sum(r[2] for r in records)
+    misses = sum(r[3] for r in records)
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        "requests": len(records),
+        "rps": len(records) / elapsed,
+        "error_rate": errors / len(records),
+        "cache_hit_ratio": hits / (hits + misses) if hits + misses else None,
+        "mean": float(latencies.mean()),
+        "p50": float(p50),
+        "p95": float(p95),
+        "p99": float(p99),
+        "max": float(latencies.max()),
+    }
+
+
+def print_summary(name, s):
+    hit_ratio = "-" if s["cache_hit_ratio"] is None else f"{s['cache_hit_ratio']:.1%}"
+    print(
+        f"{name:<24} {s['requests']:>8} {s['rps']:>9.1f} {s['error_rate']:>7.1%} "
+        f"{hit_ratio:>7} {s['p50'] * 1000:>9.1f} {s['p95'] * 1000:>9.1f} "
+        f"{s['p99'] * 1000:>9.1f}"
+    )
+
+
+def run(args) -> Dict[str, Any]:
+    recorder = Recorder()
+    start = time.perf_counter()
+    deadline = start + args.duration
+    threads = [
+        threading.Thread(target=worker, args=(args, i, deadline, recorder))
+        for i in range(args.concurrency)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    results = {
+        name: summarize(records, elapsed)
+        for name, records in sorted(recorder.records.items())
+    }
+    all_records = [r for records in recorder.records.values() for r in records]
+    if all_records:
+        results["total"] = summarize(all_records, elapsed)
+
+    print(
+        f"{'request':<24} {'count':>8} {'rps':>9} {'errors':>7} {'cache':>7} "
+        f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    )
+    for name, s in results.items():
+        print_summary(name, s)
+    return results
+
+
+def parse_mix(value):
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        if name not in REQUESTS:
+            raise argparse.ArgumentTypeError(
+                f"unknown request type {name!r}, expected one of {list(REQUESTS)}"
+            )
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def parse_range(value):
+    low, _, high = value.partition("-")
+    return int(low), int(high)
+
+
+def read_keywords(path):
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HTTP load test for the backend")
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument(
+        "--mix",
+        type=parse_mix,
+        default=DEFAULT_MIX,
+        help="weighted request types, e.g. search_psql_semantic=3,ratings=1",
+    )
+    parser.add_argument(
+        "--keywords",
+        type=read_keywords,
+        default=SAMPLE_KEYWORDS,
+        help="file with one keyword per line, most popular first",
+    )
+    parser.add_argument("--distribution", choices=["uniform", "zipf"], default="zipf")
+    parser.add_argument("--zipf-s", type=float, default=1.1)
+    parser.add_argument("--product-ids", type=parse_range, default=(1, 100000))
+    parser.add_argument("--user-ids", type=parse_range, default=(1, 100000))
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    results = run(args)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
@@ -0,0 +1,236 @@
+"""
+Request metrics: stage timers, counters and latency histograms.
+
+Code on the hot path wraps its work in `stage("db")`, `stage("embedding")`
+etc. Every stage is observed in the backend_stage_seconds histogram and, while
+a request is being served (see track_timings()), added to that request's
+timings, which the backend returns as a Server-Timing header. /metrics renders
+all metrics in the Prometheus text format.
+
+Metrics live in the memory of the serving process; with several worker
+processes each one reports its own.
+"""
+
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+import psycopg
+
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+
+REGISTRY = []
+
+# Stage timings of the request being served: {stage: [seconds, count]}.
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+# SQL statements of the request being served, see track_statements().
+_request_statements = contextvars.ContextVar("request_statements", default=None)
+
+# Longer parameter lists (query vectors) are cut to this many characters.
+STATEMENT_PARAMS_MAX_CHARS = 200
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in pairs
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}
+        REGISTRY.append(self)
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for labels, value in sorted(self.values.items()):
+                lines.append(
+                    f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+                )
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        # labels -> [per-bucket counts (last one is +Inf), sum]
+        self.values = {}
+        REGISTRY.append(self)
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.setdefault(labels, [[0] * (len(self.buckets) + 1), 0.0])
+            entry[0][index] += 1
+            entry[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            items = sorted(
+                (labels, list(counts), total)
+                for labels, (counts, total) in self.values.items()
+            )
+        for labels, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = _format_labels(self.labelnames, labels, [("le", bound)])
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            suffix = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{suffix} {total}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+
+REQUESTS = Counter(
+    "backend_requests_total", "HTTP requests served", ["method", "path", "status"]
+)
+REQUEST_SECONDS = Histogram(
+    "backend_request_seconds", "HTTP request latency", ["method", "path"]
+)
+STAGE_SECONDS = Histogram(
+    "backend_stage_seconds",
+    "Time spent per stage (embedding, db, mongo, es, cache, recommend)",
+    ["stage"],
+)
+CACHE_REQUESTS = Counter(
+    "backend_cache_requests_total", "Cache lookups per function", ["func", "result"]
+)
+PREFETCHES = Counter(
+    "backend_prefetch_total",
+    "Prefetched rating pages (done, failed, dropped, expired)",
+    ["result"],
+)
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def track_timings():
+    """
+    Start collecting stage timings for the current context, like
+    cache.track_cache_stats(). Returns the dict that stage() fills in.
+    """
+    timings = {}
+    _request_timings.set(timings)
+    return timings
+
+
+@contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, name)
+        timings = _request_timings.get()
+        if timings is not None:
+            entry = timings.setdefault(name, [0.0, 0])
+            entry[0] += elapsed
+            entry[1] += 1
+
+
+def current_timings():
+    """The stage timings collected for the current context, or None."""
+    return _request_timings.get()
+
+
+def track_statements():
+    """
+    Start recording the SQL statements of the current context. Returns the
+    list that TimedCursor appends {"query", "params", "seconds"} dicts to.
+    """
+    statements = []
+    _request_statements.set(statements)
+    return statements
+
+
+def timed(name):
+    """Decorator form of stage()."""
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def server_timing(timings, total=None):
+    """Format stage timings as a Server-Timing header value (milliseconds)."""
+    entries = [
+        f'{name};dur={seconds * 1000:.2f};desc="{count}x"'
+        for name, (seconds, count) in timings.items()
+    ]
+    if total is not None:
+        entries.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(entries)
+
+
+class TimedCursor(psycopg.Cursor):
+    """
+    Cursor that times every statement as the "db" stage and, while
+    track_statements() is active, records it.
+    """
+
+    def record(self, query, params, seconds):
+        statements = _request_statements.get()
+        if statements is None:
+            return
+        if not isinstance(query, (str, bytes)):
+            query = query.as_string(self)
+        elif isinstance(query, bytes):
+            query = query.decode()
+        params = repr(params)
+        if len(params) > STATEMENT_PARAMS_MAX_CHARS:
+            params = params[:STATEMENT_PARAMS_MAX_CHARS] + "..."
+        statements.append({"query": query, "params": params, "seconds": seconds})
+
+    def execute(self, query, params=None, **kwargs):
+        start = time.perf_counter()
+        try:
+            with stage("db"):
+                return super().execute(query, params, **kwargs)
+        finally:
+            self.record(query, params, time.perf_counter() - start)
+
+    def executemany(self, query, params_seq, **kwargs):
+        start = time.perf_counter()
+        try:
+            with stage("db"):
+                return super().executemany(query, params_seq, **kwargs)
+        finally:
+            self.record(query, "<executemany>", time.perf_counter() - start)
@@ -0,0 +1,89 @@
+"""
+Prefetch of the ratings that usually follow a product search.
+
+After /search returns products, clients mostly open the first few of them
+next, i.e. call /ratings?product_id= for each. With PREFETCH_PRODUCTS > 0 the
+backend queues the first page of ratings of the top PREFETCH_PRODUCTS
+results right after the search, and background threads load them into the
+cache, so those follow-up calls are cache hits.
+
+Prefetching must never slow down real requests, so it is bounded:
+
+- PREFETCH_WORKERS worker threads (one by default), each with a database
+  connection of its own, opened on first use and again after an error;
+- at most PREFETCH_QUEUE pending products, further ones are dropped;
+- a product not started within PREFETCH_BUDGET_MS of its search is skipped,
+  as the client has most likely asked for it already.
+
+Outcomes are counted in backend_prefetch_total.
+"""
+
+import os
+import queue
+import threading
+import time
+
+from metrics import PREFETCHES
+
+PREFETCH_PRODUCTS = int(os.getenv("PREFETCH_PRODUCTS", "0"))
+PREFETCH_BUDGET_SECONDS = float(os.getenv("PREFETCH_BUDGET_MS", "500")) / 1000
+PREFETCH_QUEUE = int(os.getenv("PREFETCH_QUEUE", "64"))
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", "1"))
+
+
+class Prefetcher:
+    """
+    Calls `fetch(connection, product_id)` in the background for submitted
+    products, where `connection` is the worker's own `connect()`.
+    """
+
+    def __init__(
+        self, fetch, connect, products=PREFETCH_PRODUCTS, workers=PREFETCH_WORKERS
+    ):
+        self.fetch = fetch
+        self.connect = connect
+        self.products = products
+        self.pending = queue.Queue(maxsize=PREFETCH_QUEUE)
+        self.stopping = threading.Event()
+        self.workers = [
+            threading.Thread(target=self.run, name=f"prefetch-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self.workers:
+            worker.start()
+
+    def submit(self, product_ids):
+        deadline = time.monotonic() + PREFETCH_BUDGET_SECONDS
+        for product_id in product_ids[: self.products]:
+            try:
+                self.pending.put_nowait((product_id, deadline))
+            except queue.Full:
+                PREFETCHES.inc("dropped")
+
+    def stop(self, timeout=5):
+        """Stops the workers and closes their connections."""
+        self.stopping.set()
+        for worker in self.workers:
+            worker.join(timeout)
+
+    def run(self):
+        connection = None
+        while not self.stopping.is_set():
+            try:
+                product_id, deadline = self.pending.get(timeout=1)
+            except queue.Empty:
+                continue
+            if time.monotonic() > deadline:
+                PREFETCHES.inc("expired")
+                continue
+            try:
+                if connection is None or connection.closed:
+                    connection = self.connect()
+                self.fetch(connection, product_id)
+            except Exception as e:
+                PREFETCHES.inc("failed")
+                print(f"Prefetch of product {product_id} failed: {e!r}")
+            else:
+                PREFETCHES.inc("done")
+        if connection is not None:
+            connection.close()
@@ -0,0 +1,183 @@
+"""
+Opt-in profiling of single requests on a live instance.
+
+A request carrying `X-Profile-Token: <PROFILE_TOKEN>` runs its endpoint under
+a profiler. `X-Profile: cprofile` (default) uses the deterministic cProfile;
+`X-Profile: sampling` uses pyinstrument if it is installed. The profile is
+stored in PROFILE_DIR together with the request, the SQL statements it ran
+with their timings and its stage timings, and the response names it in the
+X-Profile-Id header. Download it later from /profiles/{id}/download (a .prof
+file for snakeviz/flameprof, or pyinstrument's HTML flame view).
+
+Only one request is profiled at a time; a second one gets 409 with
+Retry-After. Without PROFILE_TOKEN profiling is disabled.
+"""
+
+import asyncio
+import cProfile
+import hmac
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from pathlib import Path
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", "./profiles"))
+# Only the newest profiles are kept.
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+PROFILE_MODES = ["cprofile", "sampling"]
+
+# The profiling request being served: {"id", "mode", "profiler"}.
+_profile_request = ContextVar("profile_request", default=None)
+# cProfile is built on sys.monitoring since Python 3.12, which allows one
+# profiler per process: enabling a second raises ValueError. Held from
+# start_request() to end_request().
+_profiling = threading.Lock()
+
+
+class ProfilerBusy(Exception):
+    """Another request is being profiled."""
+
+
+def authorized(token):
+    return bool(PROFILE_TOKEN) and token is not None and hmac.compare_digest(
+        token.encode(), PROFILE_TOKEN.encode()
+    )
+
+
+def start_request(mode):
+    """
+    Mark the current context as profiled. Returns the dict that profiled()
+    stores the profiler in. Raises ProfilerBusy while another request is
+    profiled; otherwise end_request() must follow.
+    """
+    if mode not in PROFILE_MODES:
+        raise ValueError(
+            f"Unknown profile mode {mode!r}, expected one of {PROFILE_MODES}"
+        )
+    if not _profiling.acquire(blocking=False):
+        raise ProfilerBusy("another request is being profiled")
+    request = {"id": uuid.uuid4().hex, "mode": mode, "profiler": None}
+    _profile_request.set(request)
+    return request
+
+
+def end_request():
+    _profiling.release()
+
+
+@contextmanager
+def run_profiler(request):
+    if request["mode"] == "sampling":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            request["mode"] = "cprofile"
+        else:
+            profiler = Profiler(interval=0.001, async_mode="disabled")
+            profiler.start()
+            try:
+                yield
+            finally:
+                profiler.stop()
+                request["profiler"] = profiler
+            return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        request["profiler"] = profiler
+
+
+def profiled(func):
+    """
+    Run the endpoint under the profiler when its request asked for it.
+
+    The profiler starts inside the endpoint rather than in the middleware:
+    pyinstrument only samples the thread it is started in, and sync endpoints
+    run in a worker thread. cProfile is process-wide, so it also records
+    whatever other threads run meanwhile; starting it here keeps that window
+    as short as the endpoint.
+    """
+    if asyncio.iscoroutinefunction(func):
+
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            request = _profile_request.get()
+            if request is None:
+                return await func(*args, **kwargs)
+            with run_profiler(request):
+                return await func(*args, **kwargs)
+
+        return async_wrapper
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        request = _profile_request.get()
+        if request is None:
+            return func(*args, **kwargs)
+        with run_profiler(request):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def profile_path(profile_id, mode):
+    suffix = ".html" if mode == "sampling" else ".prof"
+    return PROFILE_DIR / f"{profile_id}{suffix}"
+
+
+def save(request, meta):
+    """Write the profile and its metadata, then drop the oldest profiles."""
+    profiler = request["profiler"]
+    if profiler is None:
+        return None
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    path = profile_path(request["id"], request["mode"])
+    if request["mode"] == "sampling":
+        path.write_text(profiler.output_html(), encoding="utf-8")
+    else:
+        profiler.dump_stats(path)
+    meta = {
+        "id": request["id"],
+        "mode": request["mode"],
+        "created": time.time(),
+        **meta,
+    }
+    with open(PROFILE_DIR / f"{request['id']}.json", "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2, default=str)
+
+    for old in list_profiles()[PROFILE_KEEP:]:
+        for p in PROFILE_DIR.glob(f"{old['id']}.*"):
+            p.unlink(missing_ok=True)
+    return meta
+
+
+def list_profiles():
+    """Metadata of the stored profiles, newest first, without statements."""
+    profiles = []
+    for path in PROFILE_DIR.glob("*.json"):
+        with open(path, encoding="utf-8") as f:
+            meta = json.load(f)
+        meta.pop("statements", None)
+        profiles.append(meta)
+    return sorted(profiles, key=lambda m: m["created"], reverse=True)
+
+
+def load_profile(profile_id):
+    """Metadata of one profile, or None. Ids are hex, anything else is rejected."""
+    if not all(c in "0123456789abcdef" for c in profile_id):
+        return None
+    path = PROFILE_DIR / f"{profile_id}.json"
+    if not path.exists():
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
@@ -1,7 +1,9 @@
 import numpy as np
 import psycopg
 
+from ann import ann_cursor
 from cache import cache
+from metrics import timed
 
 
 def load_product_embeddings(
@@ -24,7 +26,11 @@ def load_product_embeddings(
 
 
 def find_similar_users(
-    db_connection: psycopg.Connection, target_user_id: int, top_k: int = 5
+    db_connection: psycopg.Connection,
+    target_user_id: int,
+    top_k: int = 5,
+    ef_search: int | None = None,
+    probes: int | None = None,
 ) -> list[int]:
     """
     查找与目标用户最相似的用户。
@@ -32,9 +38,11 @@ def find_similar_users(
     :param db_connection: 数据库连接。
     :param target_user_id: 目标用户 ID。
     :param top_k: 返回的相似用户数量。
+    :param ef_search: HNSW 搜索宽度，None 表示使用默认值。
+    :param probes: IVFFlat 探测列表数，None 表示使用默认值。
     :return: 相似用户的 ID 列表。
     """
-    with db_connection.cursor() as cursor:
+    with ann_cursor(db_connection, ef_search, probes) as cursor:
         cursor.execute(
             """
             SELECT user_id, user_embedding <=> (SELECT user_embedding FROM users WHERE user_id = %s) AS similarity
@@ -68,7 +76,11 @@ def get_user_embedding(
 
 
 def recommend_related_embedding(
-    db_connection: psycopg.Connection, user_id: int, top_k: int = 5
+    db_connection: psycopg.Connection,
+    user_id: int,
+    top_k: int = 5,
+    ef_search: int | None = None,
+    probes: int | None = None,
 ) -> list[int]:
     """
     根据协同过滤为用户推荐商品。
@@ -76,9 +88,13 @@ def recommend_related_embedding(
     :param db_connection: 数据库连接。
     :param user_id: 用户 ID。
     :param top_k: 推荐商品数量。
+    :param ef_search: HNSW 搜索宽度，None 表示使用默认值。
+    :param probes: IVFFlat 探测列表数，None 表示使用默认值。
     :return: 推荐的商品 ID 列表。
     """
-    similar_users = find_similar_users(db_connection, user_id, top_k=5)
+    similar_users = find_similar_users(
+        db_connection, user_id, top_k=5, ef_search=ef_search, probes=probes
+    )
     with db_connection.cursor() as cursor:
         cursor.execute(
             """
@@ -171,7 +187,11 @@ def recommend_related(
 
 
 def recommend_embedding(
-    db_connection: psycopg.Connection, user_id: int, top_k: int = 5
+    db_connection: psycopg.Connection,
+    user_id: int,
+    top_k: int = 5,
+    ef_search: int | None = None,
+    probes: int | None = None,
 ) -> list[dict]:
     """
     根据用户嵌入优化搜索结果。
@@ -179,9 +199,11 @@ def recommend_embedding(
     :param db_connection: 数据库连接。
     :param user_id: 用户 ID。
     :param top_k: 推荐商品数量。
+    :param ef_search: HNSW 搜索宽度，None 表示使用默认值。
+    :param probes: IVFFlat 探测列表数，None 表示使用默认值。
     :return: 按优化排序后的搜索结果。
     """
-    with db_connection.cursor() as cursor:
+    with ann_cursor(db_connection, ef_search, probes) as cursor:
         cursor.execute(
             """
             SELECT product_id, title_embedding <=> (SELECT user_embedding FROM users WHERE user_id = %s) AS similarity
@@ -196,13 +218,21 @@ def recommend_embedding(
     return list(products)
 
 
-@cache(cache_keys=["user_id", "method", "top_k"])
+@cache(cache_keys=["user_id", "method", "top_k", "ef_search", "probes"])
+@timed("recommend")
 def recommend(
-    db_connection: psycopg.Connection, user_id: int, method: str, top_k: int = 5
+    db_connection: psycopg.Connection,
+    user_id: int,
+    method: str,
+    top_k: int = 5,
+    ef_search: int | None = None,
+    probes: int | None = None,
 ) -> list[int]:
     if method == "related":
         return recommend_related(db_connection, user_id, top_k)
     elif method == "related_embedding":
-        return recommend_related_embedding(db_connection, user_id, top_k)
+        return recommend_related_embedding(
+            db_connection, user_id, top_k, ef_search, probes
+        )
     else:
-        return recommend_embedding(db_connection, user_id, top_k)
+        return recommend_embedding(db_connection, user_id, top_k, ef_search, probes)
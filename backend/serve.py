@@ -0,0 +1,86 @@
+"""
+Run the backend with several uvicorn worker processes sharing one encoder.
+
+The encoder (ENCODER, default sentence-transformers) is loaded once, in the
+sidecar process of encoder_server.py. The workers start with ENCODER=remote
+and send their queries to it over a Unix socket, so adding workers adds
+request-handling capacity without adding copies of the model.
+
+Everything else is per worker: its database connection pool (DB_POOL_SIZE),
+its metrics, and its own copy of the in-memory indexes, the product catalog
+(catalog.py), the category bitmaps (categories.py) and the suggest index
+(suggest.py). Every worker loads and refreshes these on connections of its
+own, so their memory and the load they put on Postgres at startup grow with
+--workers; each worker logs their sizes when they are loaded. Plan for up to
+workers * (DB_POOL_SIZE + PREFETCH_WORKERS + 3) Postgres connections. With
+CATALOG=0 the workers look products up in Postgres instead of keeping a
+catalog.
+
+    python serve.py --workers 8
+    ENCODER=onnx ENCODER_THREADS=8 python serve.py --workers 16 --port 8000
+
+With --warmup N the N hottest recorded cache keys are replayed (see
+warmup.py) after the sidecar is up and before the server starts listening.
+"""
+
+import argparse
+import multiprocessing
+import os
+import secrets
+
+import uvicorn
+
+from encoder import DEFAULT_SOCKET
+from encoder_server import serve
+
+
+def main(args):
+    sidecar = None
+    if args.encoder != "none":
+        authkey = secrets.token_hex(16)
+        # spawn: the sidecar must not inherit anything from this process
+        # that is not fork-safe, and the uvicorn workers are spawned too.
+        sidecar = multiprocessing.get_context("spawn").Process(
+            target=serve,
+            args=(args.socket, authkey.encode(), args.encoder),
+            name="encoder-sidecar",
+            daemon=True,
+        )
+        sidecar.start()
+        os.environ.update(
+            ENCODER="remote", ENCODER_SOCKET=args.socket, ENCODER_AUTHKEY=authkey
+        )
+
+    try:
+        if args.warmup:
+            from warmup import print_report, warm_up
+
+            print_report(warm_up(args.warmup, args.warmup_concurrency))
+        uvicorn.run("backend:app", host=args.host, port=args.port, workers=args.workers)
+    finally:
+        if sidecar is not None:
+            sidecar.terminate()
+            sidecar.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-worker backend")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument(
+        "--encoder",
+        default=os.getenv("ENCODER", "sentence-transformers"),
+        help="encoder loaded once by the sidecar (none: no sidecar)",
+    )
+    parser.add_argument(
+        "--socket", default=os.getenv("ENCODER_SOCKET", DEFAULT_SOCKET)
+    )
+    parser.add_argument(
+        "--warmup",
+        type=int,
+        default=0,
+        help="replay this many hot cache keys before serving (0: none)",
+    )
+    parser.add_argument("--warmup-concurrency", type=int, default=4)
+    main(parser.parse_args())
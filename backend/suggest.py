@@ -0,0 +1,195 @@
+"""
+In-memory prefix index over product names for search-as-you-type.
+
+Names are normalized (lower case, words joined by single spaces) and every
+product gets one key per word among its first SUGGEST_MAX_WORDS, the name
+from that word on, so "cam" completes "Digital Camera" as well as "Camera
+Bag". The keys are kept as one sorted fixed-width byte array (UTF-8, cut to
+SUGGEST_KEY_BYTES), so a prefix is two binary searches, and every product
+has a popularity weight, its number of ratings. The best completions of the
+one- and two-byte prefixes, which match the largest ranges, are computed
+when the index is built.
+
+SuggestIndex builds the index in the background and rebuilds it every
+SUGGEST_RELOAD_SECONDS. Query characters past SUGGEST_KEY_BYTES are ignored.
+"""
+
+import os
+import re
+import threading
+import time
+
+import numpy as np
+import psycopg
+
+SUGGEST_MAX_WORDS = int(os.getenv("SUGGEST_MAX_WORDS", "3"))
+SUGGEST_KEY_BYTES = int(os.getenv("SUGGEST_KEY_BYTES", "24"))
+SUGGEST_RELOAD_SECONDS = float(os.getenv("SUGGEST_RELOAD_SECONDS", "600"))
+# Largest top_k served; also how many completions are precomputed per prefix.
+SUGGEST_MAX_K = 50
+
+SQL_COPY_WEIGHTED_PRODUCTS = """
+COPY (
+    SELECT p.product_id, p.name, coalesce(s.rating_count, 0)
+    FROM products p LEFT JOIN product_rating_stats s USING (product_id)
+) TO STDOUT
+"""
+SQL_COPY_PRODUCTS = "COPY (SELECT product_id, name, 0 FROM products) TO STDOUT"
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def normalize(text):
+    return " ".join(_WORD_RE.findall(text.lower()))
+
+
+def name_keys(name):
+    """The name from each of its first SUGGEST_MAX_WORDS words on."""
+    words = normalize(name or "").split(" ")
+    return [" ".join(words[i:]) for i in range(min(len(words), SUGGEST_MAX_WORDS))]
+
+
+class SuggestSnapshot:
+    """An immutable prefix index; rebuilding makes a new snapshot."""
+
+    def __init__(self, rows):
+        product_ids, weights, keys, entries = [], [], [], []
+        for i, (product_id, name, weight) in enumerate(rows):
+            product_ids.append(product_id)
+            weights.append(weight)
+            for key in name_keys(name):
+                keys.append(key.encode()[:SUGGEST_KEY_BYTES])
+                entries.append(i)
+        keys = np.array(keys, dtype=f"S{SUGGEST_KEY_BYTES}")
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.entries = np.array(entries, dtype=np.int32)[order]
+        self.product_ids = np.array(product_ids, dtype=np.int64)
+        self.weights = np.array(weights, dtype=np.int64)
+        self.entry_weights = self.weights[self.entries]
+        self.top = {}
+        for width in (1, 2):
+            prefixes, starts = np.unique(
+                self.keys.astype(f"S{width}"), return_index=True
+            )
+            ends = np.append(starts[1:], len(self.keys))
+            for prefix, lo, hi in zip(prefixes.tolist(), starts, ends):
+                self.top[prefix] = self.best(lo, hi, SUGGEST_MAX_K)
+
+    def __len__(self):
+        return len(self.product_ids)
+
+    @property
+    def nbytes(self):
+        return (
+            self.keys.nbytes
+            + self.entries.nbytes
+            + self.product_ids.nbytes
+            + self.weights.nbytes
+            + self.entry_weights.nbytes
+        )
+
+    def range(self, prefix):
+        lo = np.searchsorted(self.keys, prefix, side="left")
+        if len(prefix) >= SUGGEST_KEY_BYTES:
+            hi = np.searchsorted(self.keys, prefix, side="right")
+        else:
+            # 0xff never occurs in UTF-8, so it sorts after every completion.
+            hi = np.searchsorted(self.keys, prefix + b"\xff", side="left")
+        return int(lo), int(hi)
+
+    def best(self, lo, hi, k):
+        """The k heaviest distinct products among the keys lo:hi."""
+        # A product has at most SUGGEST_MAX_WORDS keys in any range.
+        m = min(hi - lo, k * SUGGEST_MAX_WORDS)
+        if m == 0:
+            return []
+        weights = self.entry_weights[lo:hi]
+        candidates = np.argpartition(-weights, m - 1)[:m]
+        candidates = candidates[np.argsort(-weights[candidates], kind="stable")]
+        products = []
+        for entry in self.entries[lo + candidates].tolist():
+            if entry not in products:
+                products.append(entry)
+                if len(products) == k:
+                    break
+        return products
+
+    def complete(self, text, k):
+        """Up to k (product_id, weight) pairs completing `text`, heaviest first."""
+        prefix = normalize(text).encode()[:SUGGEST_KEY_BYTES]
+        if not prefix:
+            return []
+        products = self.top.get(prefix)
+        if products is None:
+            products = self.best(*self.range(prefix), k)
+        return [
+            (int(self.product_ids[i]), int(self.weights[i])) for i in products[:k]
+        ]
+
+
+class SuggestIndex:
+    """
+    Background-built prefix index. complete() returns None until the first
+    build has finished.
+    """
+
+    def __init__(self, db_url):
+        self.db_url = db_url
+        self.snapshot = None
+        self.error = None
+        self.stopped = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self.run, name="suggest", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                with psycopg.connect(self.db_url, autocommit=True) as conn:
+                    self.reload(conn)
+            except Exception as e:
+                # Keep serving the last snapshot and try again later.
+                self.error = repr(e)
+                print(f"Suggest index build failed: {self.error}")
+            self.stopped.wait(SUGGEST_RELOAD_SECONDS)
+
+    def load_rows(self, conn):
+        try:
+            sql = SQL_COPY_WEIGHTED_PRODUCTS
+            with conn.cursor() as cur, cur.copy(sql) as copy:
+                copy.set_types(["int4", "text", "int8"])
+                return list(copy.rows())
+        except psycopg.errors.UndefinedTable:
+            # Without product_rating_stats all products weigh the same.
+            with conn.cursor() as cur, cur.copy(SQL_COPY_PRODUCTS) as copy:
+                copy.set_types(["int4", "text", "int8"])
+                return list(copy.rows())
+
+    def reload(self, conn):
+        start = time.perf_counter()
+        snapshot = SuggestSnapshot(self.load_rows(conn))
+        self.snapshot = snapshot
+        self.error = None
+        print(
+            f"Suggest index built for {len(snapshot)} products "
+            f"({snapshot.nbytes / 2**20:.1f} MiB) in {time.perf_counter() - start:.1f}s."
+        )
+
+    def complete(self, text, k):
+        snapshot = self.snapshot
+        if snapshot is None:
+            return None
+        return snapshot.complete(text, k)
+
+    def status(self):
+        snapshot = self.snapshot
+        return {
+            "products": len(snapshot) if snapshot is not None else None,
+            "bytes": snapshot.nbytes if snapshot is not None else None,
+            "error": self.error,
+        }
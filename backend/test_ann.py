@@ -0,0 +1,40 @@
+import pytest
+
+from ann import MAX_EF_SEARCH, QUALITY_PRESETS, resolve_ann_settings
+
+
+def test_no_quality_keeps_server_defaults():
+    assert resolve_ann_settings() == (None, None)
+
+
+@pytest.mark.parametrize("quality", list(QUALITY_PRESETS))
+def test_presets(quality):
+    preset = QUALITY_PRESETS[quality]
+    assert resolve_ann_settings(quality) == (preset["ef_search"], preset["probes"])
+
+
+def test_explicit_values_override_the_preset():
+    assert resolve_ann_settings("fast", ef_search=100) == (100, 1)
+    assert resolve_ann_settings("accurate", probes=5) == (200, 5)
+    assert resolve_ann_settings(None, 64, 8) == (64, 8)
+
+
+def test_unknown_quality():
+    with pytest.raises(ValueError, match="Unknown quality"):
+        resolve_ann_settings("best")
+
+
+@pytest.mark.parametrize("ef_search", [0, -1, MAX_EF_SEARCH + 1])
+def test_ef_search_out_of_range(ef_search):
+    with pytest.raises(ValueError, match="ef_search"):
+        resolve_ann_settings(ef_search=ef_search)
+
+
+def test_ef_search_bounds_are_inclusive():
+    assert resolve_ann_settings(ef_search=1) == (1, None)
+    assert resolve_ann_settings(ef_search=MAX_EF_SEARCH) == (MAX_EF_SEARCH, None)
+
+
+def test_probes_must_be_positive():
+    with pytest.raises(ValueError, match="probes"):
+        resolve_ann_settings(probes=0)
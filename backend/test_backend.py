@@ -0,0 +1,86 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import backend
+import cache
+
+ROWS = [{"product_id": 123, "user_id": 7, "rating": 5.0, "timestamp": 1, "title": "t"}]
+
+
+class Cursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        self.connection.queries.append((query, params))
+
+    def fetchall(self):
+        return ROWS
+
+
+class Connection:
+    def __init__(self):
+        self.queries = []
+
+    def cursor(self):
+        return Cursor(self)
+
+
+class SyncPrefetcher:
+    """Runs the prefetch of every submitted product right away."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.submitted = []
+
+    def submit(self, product_ids):
+        self.submitted += product_ids
+        for product_id in product_ids:
+            backend.get_ratings_page(
+                product_id, backend.ratings_page_size, self.connection
+            )
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(cache, "redis_client", cache.MemoryRedis())
+    connection = Connection()
+    backend.app.dependency_overrides[backend.get_db] = lambda: connection
+    backend.app.dependency_overrides[backend.get_mongo] = lambda: None
+    yield TestClient(backend.app), connection
+    backend.app.dependency_overrides.clear()
+
+
+def es_hit(product_id, name):
+    return {"_score": 1.0, "_source": {"productId": str(product_id), "name": name}}
+
+
+def test_elastic_product_ids_are_ints():
+    product = backend.elastic_product(es_hit(123, "Camera"))
+    assert product == {"name": "Camera", "product_id": 123, "amazon_id": None}
+
+
+def test_prefetch_after_elastic_search_warms_the_ratings_page(client, monkeypatch):
+    client, connection = client
+    prefetcher = SyncPrefetcher(connection)
+    monkeypatch.setattr(backend, "prefetcher", prefetcher)
+    monkeypatch.setattr(
+        backend, "search_elastic", lambda *args: [es_hit(123, "Camera")]
+    )
+    params = {"keyword": "camera", "backend": "elastic"}
+    response = client.post("/search", params=params)
+    assert response.status_code == 200
+    assert prefetcher.submitted == [123]
+    assert len(connection.queries) == 1
+
+    # The click on the product reads the page the prefetch cached.
+    response = client.get("/ratings", params={"product_id": 123})
+    assert response.status_code == 200
+    assert response.json() == ROWS
+    assert len(connection.queries) == 1
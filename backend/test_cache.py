@@ -0,0 +1,128 @@
+import numpy as np
+import pytest
+
+import cache
+from cache import SemanticCache, normalize_keyword
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    return clock
+
+
+def vec(*values):
+    return np.array(values, dtype=np.float32)
+
+
+def test_disabled_without_max_distance():
+    semantic = SemanticCache(capacity=4, max_distance=0)
+    semantic.put("ns", vec(1, 0), "a")
+    assert semantic.get("ns", vec(1, 0)) is None
+
+
+def test_hit_within_max_distance(clock):
+    semantic = SemanticCache(capacity=4, max_distance=0.05)
+    semantic.put("ns", vec(1, 0, 0), "a")
+    semantic.put("ns", vec(0, 1, 0), "b")
+    # Only the direction counts.
+    assert semantic.get("ns", vec(3, 0, 0)) == "a"
+    assert semantic.get("ns", vec(1, 0.1, 0)) == "a"
+    assert semantic.get("ns", vec(1, 1, 0)) is None
+    assert semantic.get("ns", vec(0, 0, 1)) is None
+
+
+def test_namespaces_are_separate(clock):
+    semantic = SemanticCache(capacity=4, max_distance=0.05)
+    semantic.put(("f", 10), vec(1, 0), "top 10")
+    semantic.put(("f", 20), vec(1, 0), "top 20")
+    assert semantic.get(("f", 10), vec(1, 0)) == "top 10"
+    assert semantic.get(("f", 20), vec(1, 0)) == "top 20"
+    assert semantic.get(("f", 30), vec(1, 0)) is None
+
+
+def test_entries_expire(clock):
+    semantic = SemanticCache(capacity=4, max_distance=0.05, ttl=60)
+    semantic.put("ns", vec(1, 0), "a")
+    clock.now += 59
+    assert semantic.get("ns", vec(1, 0)) == "a"
+    clock.now += 1
+    assert semantic.get("ns", vec(1, 0)) is None
+
+
+def test_expired_slots_are_reused_first(clock):
+    semantic = SemanticCache(capacity=2, max_distance=0.05, ttl=60)
+    semantic.put("ns", vec(1, 0), "old")
+    clock.now += 30
+    semantic.put("ns", vec(0, 1), "young")
+    clock.now += 40
+    semantic.put("ns", vec(1, 1), "new")
+    assert semantic.get("ns", vec(0, 1)) == "young"
+    assert semantic.get("ns", vec(1, 1)) == "new"
+
+
+def test_least_recently_used_is_replaced(clock):
+    semantic = SemanticCache(capacity=2, max_distance=0.05)
+    semantic.put("ns", vec(1, 0, 0), "a")
+    semantic.put("ns", vec(0, 1, 0), "b")
+    assert semantic.get("ns", vec(1, 0, 0)) == "a"
+    semantic.put("ns", vec(0, 0, 1), "c")
+    assert semantic.get("ns", vec(0, 1, 0)) is None
+    assert semantic.get("ns", vec(1, 0, 0)) == "a"
+    assert semantic.get("ns", vec(0, 0, 1)) == "c"
+
+
+def test_memory_is_bounded_by_capacity(clock):
+    semantic = SemanticCache(capacity=2, max_distance=0.05)
+    for i in range(100):
+        semantic.put(("f", i), vec(1, 0), i)
+    assert sorted(semantic.namespaces) == [("f", 98), ("f", 99)]
+    assert semantic.get(("f", 0), vec(1, 0)) is None
+    assert semantic.get(("f", 99), vec(1, 0)) == 99
+
+
+def test_normalize_keyword():
+    assert normalize_keyword("  Digital   CAMERA ") == normalize_keyword("digital camera")
+
+
+@pytest.fixture
+def hot_set(monkeypatch):
+    monkeypatch.setattr(cache, "hot_keys_client", cache.MemoryRedis())
+    monkeypatch.setattr(cache, "HOT_KEYS_SAMPLE", 1)
+    # Flush by hand instead of from the background thread.
+    monkeypatch.setattr(cache, "_hot_flusher", object())
+    monkeypatch.setattr(cache, "_hot_counts", cache.Counter())
+    monkeypatch.setattr(cache, "_hot_calls", {})
+    token = cache._request_stats.set(None)
+    yield
+    cache._request_stats.reset(token)
+
+
+def test_hot_keys_are_buffered_and_trimmed(hot_set, monkeypatch):
+    monkeypatch.setattr(cache, "HOT_KEYS_MAX", 2)
+    cache.track_cache_stats()
+    for key, count in [("a", 3), ("b", 1), ("c", 2)]:
+        for _ in range(count):
+            cache.record_hot_key("f", key, {"q": key})
+    assert cache.hot_keys(10) == []
+    cache.flush_hot_keys()
+    assert cache.hot_keys(10) == [
+        ("a", 3.0, "f", {"q": "a"}),
+        ("c", 2.0, "f", {"q": "c"}),
+    ]
+    assert cache.hot_keys_client.hmget(cache.HOT_KEYS_ARGS, ["b"]) == [None]
+
+
+def test_hot_keys_skip_calls_outside_requests(hot_set):
+    cache.record_hot_key("f", "a", {})
+    cache.flush_hot_keys()
+    assert cache.hot_keys(10) == []
@@ -0,0 +1,66 @@
+import numpy as np
+
+from catalog import CatalogSnapshot, PackedColumn
+
+ROWS = [
+    (30, "Tripod", None),
+    (10, "Digital Camera", "B000A"),
+    (20, "Kamera-Tasche", "B000B"),
+]
+
+
+def rows_of(snapshot):
+    return [snapshot.row(i) for i in range(len(snapshot))]
+
+
+def test_from_rows_sorts_by_id():
+    snapshot = CatalogSnapshot.from_rows(ROWS)
+    assert snapshot.ids.tolist() == [10, 20, 30]
+    assert rows_of(snapshot) == [
+        {"name": "Digital Camera", "product_id": 10, "amazon_id": "B000A"},
+        {"name": "Kamera-Tasche", "product_id": 20, "amazon_id": "B000B"},
+        {"name": "Tripod", "product_id": 30, "amazon_id": None},
+    ]
+
+
+def test_positions():
+    snapshot = CatalogSnapshot.from_rows(ROWS)
+    # Missing ids below, between and above the stored ones are -1.
+    assert snapshot.positions([20, 5, 10, 25, 30, 99]).tolist() == [1, -1, 0, -1, 2, -1]
+    assert snapshot.positions([]).tolist() == []
+
+
+def test_positions_of_empty_snapshot():
+    snapshot = CatalogSnapshot.from_rows([])
+    assert snapshot.positions([1, 2]).tolist() == [-1, -1]
+
+
+def test_merge_upserts_and_removes():
+    snapshot = CatalogSnapshot.from_rows(ROWS)
+    merged = snapshot.merge([(20, "Camera Bag", None), (25, "Lens Cap", "B000C")], {30})
+    assert rows_of(merged) == [
+        {"name": "Digital Camera", "product_id": 10, "amazon_id": "B000A"},
+        {"name": "Camera Bag", "product_id": 20, "amazon_id": None},
+        {"name": "Lens Cap", "product_id": 25, "amazon_id": "B000C"},
+    ]
+    # Snapshots are immutable.
+    assert rows_of(snapshot) == rows_of(CatalogSnapshot.from_rows(ROWS))
+
+
+def test_merge_of_unknown_removed_ids_and_nothing():
+    snapshot = CatalogSnapshot.from_rows(ROWS)
+    assert rows_of(snapshot.merge([], {99})) == rows_of(snapshot)
+    assert rows_of(snapshot.merge([], set())) == rows_of(snapshot)
+
+
+def test_merge_into_empty_snapshot():
+    merged = CatalogSnapshot.from_rows([]).merge(ROWS, set())
+    assert rows_of(merged) == rows_of(CatalogSnapshot.from_rows(ROWS))
+
+
+def test_packed_column_keeps_utf8_and_nulls():
+    values = ["Kamera für Anfänger", None, "", "相机"]
+    column = PackedColumn.from_values(values)
+    assert [column[i] for i in range(len(values))] == values
+    taken = column.take(np.array([3, 0, 1]))
+    assert [taken[i] for i in range(3)] == ["相机", "Kamera für Anfänger", None]
@@ -0,0 +1,118 @@
+import numpy as np
+import pytest
+
+import categories
+from categories import (
+    CATEGORY_MAX_CANDIDATES,
+    CATEGORY_OVERFETCH,
+    SortedIds,
+    make_bitmap,
+    overfetch,
+)
+
+
+def ranked(limit=None):
+    """A search returning the products 0, 1, 2, ... in rank order."""
+    calls = []
+
+    def search(n):
+        calls.append(n)
+        return [{"product_id": i} for i in range(n if limit is None else min(n, limit))]
+
+    return search, calls
+
+
+def product_id(p):
+    return p["product_id"]
+
+
+def ids(results):
+    return [product_id(p) for p in results]
+
+
+def test_sorted_ids_contains():
+    members = SortedIds([3, 7, 42])
+    assert members.contains([0, 3, 5, 7, 42, 43, 2**33]).tolist() == [
+        False, True, False, True, True, False, False,
+    ]
+    assert len(members) == 3
+    assert list(members) == [3, 7, 42]
+
+
+def test_sorted_ids_contains_when_empty():
+    assert SortedIds([]).contains([1, 2]).tolist() == [False, False]
+
+
+def test_sorted_ids_union():
+    union = SortedIds.union(SortedIds([5, 1]), SortedIds([1, 9]))
+    assert list(union) == [1, 5, 9]
+    assert list(SortedIds.union()) == []
+
+
+def test_overfetch_keeps_rank_order():
+    search, calls = ranked()
+    results = overfetch(search, product_id, SortedIds([1, 2, 5, 8]), 3)
+    assert ids(results) == [1, 2, 5]
+    assert calls == [3 * CATEGORY_OVERFETCH]
+
+
+def test_overfetch_fetches_more_until_enough():
+    search, calls = ranked()
+    members = SortedIds([100, 200])
+    assert ids(overfetch(search, product_id, members, 2)) == [100, 200]
+    expected = [2 * CATEGORY_OVERFETCH]
+    while expected[-1] <= 200:
+        expected.append(expected[-1] * CATEGORY_OVERFETCH)
+    assert calls == expected
+
+
+def test_overfetch_stops_when_candidates_run_out():
+    search, calls = ranked(limit=20)
+    results = overfetch(
+        search,
+        product_id,
+        SortedIds([5, 500]),
+        2,
+        fallback=lambda: pytest.fail("fell back with candidates left to rank"),
+    )
+    assert ids(results) == [5]
+    assert calls[-1] > 20
+
+
+def test_overfetch_falls_back_at_the_cap():
+    search, calls = ranked()
+    members = SortedIds([3, CATEGORY_MAX_CANDIDATES + 10])
+    fallback = [{"product_id": 3}, {"product_id": CATEGORY_MAX_CANDIDATES + 10}]
+    results = overfetch(search, product_id, members, 2, fallback=lambda: fallback)
+    assert results is fallback
+    assert calls[-1] == CATEGORY_MAX_CANDIDATES
+
+
+def test_overfetch_without_fallback_returns_what_it_found():
+    search, _ = ranked()
+    members = SortedIds([3, CATEGORY_MAX_CANDIDATES + 10])
+    assert ids(overfetch(search, product_id, members, 2)) == [3]
+
+
+def test_overfetch_of_no_members():
+    search, calls = ranked()
+    assert overfetch(search, product_id, SortedIds([]), 5) == []
+    assert calls == []
+
+
+@pytest.mark.skipif(categories.BitMap is None, reason="pyroaring is not installed")
+def test_roaring_bitmaps_agree_with_sorted_ids():
+    sorted_ids = np.array([1, 4, 9, 16], dtype=np.int64)
+    bitmap = make_bitmap(sorted_ids)
+    probe = [0, 1, 4, 5, 16]
+    expected = SortedIds(sorted_ids).contains(probe).tolist()
+    assert categories.contains(bitmap, probe) == expected
+
+
+@pytest.mark.skipif(categories.BitMap is None, reason="pyroaring is not installed")
+def test_overfetch_of_string_ids_against_a_roaring_bitmap():
+    # Elasticsearch returns productId as a string.
+    members = make_bitmap(np.array([2, 5], dtype=np.int64))
+    candidates = [{"product_id": str(i)} for i in range(10)]
+    results = overfetch(lambda n: candidates[:n], product_id, members, 2)
+    assert ids(results) == ["2", "5"]
@@ -0,0 +1,97 @@
+from suggest import (
+    SUGGEST_KEY_BYTES,
+    SUGGEST_MAX_K,
+    SuggestSnapshot,
+    name_keys,
+    normalize,
+)
+
+ROWS = [
+    (1, "Digital Camera", 50),
+    (2, "Camera Bag", 80),
+    (3, "Camera", 10),
+    (4, "Cable", 5),
+    (5, "Kamera für Anfänger", 7),
+    (6, None, 100),
+]
+
+
+def completions(snapshot, text, k=10):
+    return [product_id for product_id, _ in snapshot.complete(text, k)]
+
+
+def test_normalize_and_name_keys():
+    assert normalize("  Digital-CAMERA, 4K!") == "digital camera 4k"
+    assert name_keys("Digital Camera Bag Deluxe") == [
+        "digital camera bag deluxe",
+        "camera bag deluxe",
+        "bag deluxe",
+    ]
+    assert name_keys(None) == [""]
+
+
+def test_range_covers_exactly_the_prefix():
+    snapshot = SuggestSnapshot(ROWS)
+    lo, hi = snapshot.range(b"camera")
+    assert sorted(snapshot.keys[lo:hi].tolist()) == [
+        b"camera", b"camera", b"camera bag",
+    ]
+    lo, hi = snapshot.range(b"zzz")
+    assert lo == hi
+
+
+def test_best_orders_by_weight_without_duplicates():
+    snapshot = SuggestSnapshot(ROWS)
+    lo, hi = snapshot.range(b"ca")
+    best = snapshot.best(lo, hi, 10)
+    assert [int(snapshot.product_ids[i]) for i in best] == [2, 1, 3, 4]
+    assert len(snapshot.best(lo, hi, 2)) == 2
+    assert snapshot.best(lo, lo, 5) == []
+
+
+def test_complete_matches_every_word_start():
+    snapshot = SuggestSnapshot(ROWS)
+    assert completions(snapshot, "cam") == [2, 1, 3]
+    assert completions(snapshot, "Camera B") == [2]
+    assert completions(snapshot, "dig") == [1]
+    assert completions(snapshot, "cam", k=1) == [2]
+    assert completions(snapshot, "") == []
+    assert completions(snapshot, "!!") == []
+    assert snapshot.complete("cam", 1) == [(2, 80)]
+
+
+def test_precomputed_short_prefixes_agree_with_search():
+    snapshot = SuggestSnapshot(ROWS)
+    for prefix in (b"c", b"ca", b"k"):
+        assert snapshot.top[prefix] == snapshot.best(
+            *snapshot.range(prefix), SUGGEST_MAX_K
+        )
+
+
+def test_non_ascii_names():
+    snapshot = SuggestSnapshot(ROWS)
+    assert completions(snapshot, "für") == [5]
+    assert completions(snapshot, "KAMERA F") == [5]
+
+
+def test_keys_are_cut_at_key_bytes():
+    long_name = "x" * (SUGGEST_KEY_BYTES + 10)
+    snapshot = SuggestSnapshot([(1, long_name, 1), (2, "x" * SUGGEST_KEY_BYTES, 2)])
+    # Query characters past SUGGEST_KEY_BYTES are ignored.
+    assert completions(snapshot, long_name + "y") == [2, 1]
+
+
+def test_utf8_cut_inside_a_character():
+    # "é" is two bytes, so the cut at SUGGEST_KEY_BYTES splits one of them.
+    name = "a" + "é" * SUGGEST_KEY_BYTES
+    snapshot = SuggestSnapshot([(1, name, 1), (2, "a" + "è" * SUGGEST_KEY_BYTES, 1)])
+    assert len(snapshot.keys[0]) == SUGGEST_KEY_BYTES
+    assert completions(snapshot, name) == [1]
+    assert completions(snapshot, "a" + "é" * 3) == [1]
+    assert sorted(completions(snapshot, "a")) == [1, 2]
+
+
+def test_empty_index():
+    snapshot = SuggestSnapshot([])
+    assert len(snapshot) == 0
+    assert snapshot.complete("cam", 5) == []
@@ -0,0 +1,165 @@
+"""
+Warm the cache up with the hottest recorded calls before taking traffic.
+
+With HOT_KEYS_SAMPLE set, the servers record a sample of the cached calls
+they make for requests in Redis (see cache.record_hot_key). This replays the
+`--top` highest scoring ones through the same cached functions,
+`--concurrency` at a time with one database connection each, so that after a
+deploy or a cache flush the first requests find their results cached instead
+of all landing on Postgres and the model.
+
+    python warmup.py --top 1000 --concurrency 4
+    python serve.py --workers 8 --warmup 1000
+
+The report says how many of the hot keys were already cached, warmed, failed
+or could not be replayed, and which share of the recorded traffic (by
+score) is now cached. With --min-coverage it exits with status 1 below that
+share, for use as a deploy gate.
+"""
+
+import argparse
+import inspect
+import json
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg
+import pymongo
+from psycopg.rows import dict_row
+
+import backend
+from cache import CACHED_FUNCTIONS, hot_keys, redis_client
+from encoder import BackgroundEncoder
+from metrics import TimedCursor
+
+
+class Resources:
+    """The arguments that are not part of a cache key, one set per thread."""
+
+    def __init__(self):
+        self.local = threading.local()
+        self.connections = []
+        self.lock = threading.Lock()
+        self.mongo_client = None
+
+    def db_connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = psycopg.connect(
+                backend.db_url,
+                row_factory=dict_row,
+                cursor_factory=TimedCursor,
+                autocommit=True,
+            )
+            with self.lock:
+                self.connections.append(conn)
+        return conn
+
+    def db_products(self):
+        with self.lock:
+            if self.mongo_client is None:
+                self.mongo_client = pymongo.MongoClient(backend.mongo_url)
+        return self.mongo_client.get_database("amazon").get_collection("products")
+
+    def es_host(self):
+        return backend.es_host
+
+    def close(self):
+        for conn in self.connections:
+            conn.close()
+        if self.mongo_client is not None:
+            self.mongo_client.close()
+
+
+RESOURCE_ARGS = ("db_connection", "db_products", "es_host")
+
+
+def replay(resources, cache_key, func_name, kwargs):
+    """Call one recorded function; returns "cached", "warmed" or a failure."""
+    if redis_client.exists(cache_key):
+        return "cached"
+    func = CACHED_FUNCTIONS.get(func_name)
+    if func is None:
+        return "unsupported"
+    kwargs = dict(kwargs)
+    for name in inspect.signature(func).parameters:
+        if name not in kwargs and name in RESOURCE_ARGS:
+            kwargs[name] = getattr(resources, name)()
+    try:
+        inspect.signature(func).bind(**kwargs)
+    except TypeError:
+        # An argument was left out of the cache key and cannot be restored.
+        return "unsupported"
+    try:
+        func(**kwargs)
+    except Exception as e:
+        print(f"Replaying {func_name}({json.dumps(kwargs, default=str)}) failed: {e!r}")
+        return "failed"
+    return "warmed"
+
+
+def warm_up(top=1000, concurrency=4):
+    """Replay the `top` hottest calls and return the coverage report."""
+    start = time.perf_counter()
+    calls = hot_keys(top)
+    if calls:
+        # The semantic searches need the encoder; load it here, not in a thread.
+        encoder = BackgroundEncoder()
+        if encoder.state == "pending":
+            encoder.load()
+        backend.model = encoder
+
+    resources = Resources()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(
+                executor.map(
+                    lambda call: replay(resources, call[0], call[2], call[3]), calls
+                )
+            )
+    finally:
+        resources.close()
+
+    total_score = sum(score for _, score, _, _ in calls)
+    covered_score = sum(
+        score
+        for (_, score, _, _), result in zip(calls, results)
+        if result in ("cached", "warmed")
+    )
+    by_function = {}
+    for (_, _, func_name, _), result in zip(calls, results):
+        by_function.setdefault(func_name, Counter())[result] += 1
+    return {
+        "keys": len(calls),
+        "results": dict(Counter(results)),
+        "functions": {name: dict(c) for name, c in by_function.items()},
+        "coverage": covered_score / total_score if total_score else 1.0,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def print_report(report):
+    print(f"Warm-up replayed {report['keys']} hot keys in {report['seconds']:.1f}s")
+    for name, results in sorted(report["functions"].items(), key=str):
+        counts = ", ".join(f"{k}={v}" for k, v in sorted(results.items()))
+        print(f"  {name}: {counts}")
+    print(f"Hot traffic covered: {report['coverage']:.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--top", type=int, default=1000, help="hot keys to replay")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument(
+        "--min-coverage",
+        type=float,
+        default=0.0,
+        help="exit with status 1 if less of the hot traffic is covered (0-1)",
+    )
+    args = parser.parse_args()
+    report = warm_up(args.top, args.concurrency)
+    print_report(report)
+    if report["coverage"] < args.min_coverage:
+        raise SystemExit(1)
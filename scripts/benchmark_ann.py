@@ -0,0 +1,144 @@
+"""
+Measure the recall/latency trade-off of pgvector search settings.
+
+For a fixed set of query vectors, the exact top-k neighbours are computed
+once with index scans disabled. Every hnsw.ef_search (or ivfflat.probes)
+value is then timed against the index and scored by recall@k, which is what
+the backend's `quality` presets (backend/ann.py) should be chosen from.
+
+    python benchmark_ann.py --index hnsw --values 10,20,40,80,160,320
+    python benchmark_ann.py --table ratings --column doc_embedding --id-column rating_id --index ivfflat
+"""
+
+import argparse
+import json
+import time
+
+import matplotlib.pyplot as plt
+import numpy as np
+import psycopg
+from tqdm.auto import tqdm
+
+from import_to_pgsql import DB_URL
+
+SETTING_NAMES = {"hnsw": "hnsw.ef_search", "ivfflat": "ivfflat.probes"}
+
+
+def sample_queries(conn, table, column, id_column, num, seed):
+    """Pick `num` stored vectors as the query set, reproducibly for a seed."""
+    conn.execute("SELECT setseed(%s)", (seed,))
+    rows = conn.execute(
+        f"SELECT {id_column}, {column}::text FROM {table} WHERE {column} IS NOT NULL ORDER BY random() LIMIT %s",
+        (num,),
+    ).fetchall()
+    return [row[1] for row in rows]
+
+
+def search(conn, table, column, id_column, query, k, settings):
+    with conn.transaction():
+        for name, value in settings.items():
+            conn.execute("SELECT set_config(%s, %s, true)", (name, str(value)))
+        start = time.perf_counter()
+        rows = conn.execute(
+            f"SELECT {id_column} FROM {table} ORDER BY {column} <=> %s LIMIT %s",
+            (query, k),
+        ).fetchall()
+        elapsed = time.perf_counter() - start
+    return [row[0] for row in rows], elapsed
+
+
+def run(table, column, id_column, index, values, num_queries, k, seed):
+    results = []
+    with psycopg.connect(DB_URL, autocommit=True) as conn:
+        queries = sample_queries(conn, table, column, id_column, num_queries, seed)
+
+        # Ground truth: the same query with the vector index disabled.
+        exact = [
+            set(search(conn, table, column, id_column, q, k, {"enable_indexscan": "off"})[0])
+            for q in tqdm(queries, desc="Exact")
+        ]
+
+        for value in values:
+            settings = {SETTING_NAMES[index]: value}
+            latencies, recalls = [], []
+            for query, truth in zip(tqdm(queries, desc=f"{index}={value}"), exact):
+                ids, elapsed = search(conn, table, column, id_column, query, k, settings)
+                latencies.append(elapsed)
+                recalls.append(len(truth.intersection(ids)) / max(len(truth), 1))
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            result = {
+                "index": index,
+                "setting": SETTING_NAMES[index],
+                "value": value,
+                "k": k,
+                "queries": len(queries),
+                "recall": float(np.mean(recalls)),
+                "mean": float(np.mean(latencies)),
+                "p50": float(p50),
+                "p95": float(p95),
+                "p99": float(p99),
+            }
+            print(
+                f"{result['setting']}={value}: recall@{k}={result['recall']:.4f}, "
+                f"p50={p50 * 1000:.2f}ms, p95={p95 * 1000:.2f}ms, p99={p99 * 1000:.2f}ms"
+            )
+            results.append(result)
+    return results
+
+
+def plot_recall_latency(results, title, filename):
+    plt.figure(figsize=(10, 6))
+    recalls = [r["recall"] for r in results]
+    p95s = [r["p95"] for r in results]
+    plt.plot(p95s, recalls, marker="s")
+    for r in results:
+        plt.annotate(str(r["value"]), (r["p95"], r["recall"]))
+
+    plt.xscale("log")
+    plt.xlabel("p95 latency (seconds)")
+    plt.ylabel(f"Recall@{results[0]['k']}")
+    plt.title(title)
+    plt.grid(True)
+
+    plt.savefig(filename)
+    plt.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--table", default="products")
+    parser.add_argument("--column", default="title_embedding")
+    parser.add_argument("--id-column", default="product_id")
+    parser.add_argument("--index", choices=SETTING_NAMES, default="hnsw")
+    parser.add_argument(
+        "--values",
+        default=None,
+        help="comma separated ef_search or probes values to sweep",
+    )
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--seed", type=float, default=0.42)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--plot", help="save a recall vs p95 latency plot here")
+    args = parser.parse_args()
+
+    default_values = {"hnsw": "10,20,40,80,160,320", "ivfflat": "1,2,5,10,20,50"}
+    values = [int(v) for v in (args.values or default_values[args.index]).split(",")]
+    results = run(
+        args.table,
+        args.column,
+        args.id_column,
+        args.index,
+        values,
+        args.queries,
+        args.k,
+        args.seed,
+    )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.plot:
+        plot_recall_latency(
+            results, f"{args.index} on {args.table}.{args.column}", args.plot
+        )
@@ -0,0 +1,363 @@
+"""
+Vector search benchmark: IVFFlat vs HNSW vs exact scans vs MongoDB.
+
+A fixed, seeded sample of stored embeddings is copied into the bench_vectors
+scratch table, and a disjoint set of embeddings from the same source becomes
+the query set. The exact top-k of every query is computed in-process with
+NumPy. Then each method is built and queried in turn:
+
+- numpy:    in-process brute force over the sample (the baseline)
+- exact:    PostgreSQL without a vector index (sequential scan)
+- ivfflat:  built with the given lists, queried per ivfflat.probes value
+- hnsw:     built with the given m/ef_construction, queried per hnsw.ef_search
+- mongodb:  $vectorSearch on a vectorSearch index (needs Atlas or Atlas Local)
+
+For each one the script reports build time, index size, recall@k and query
+latency percentiles.
+
+    python benchmark_vector.py --rows 100000 --queries 200 -k 10 --json vector.json
+    python benchmark_vector.py --methods numpy,hnsw --ef-search 20,40,80,160
+"""
+
+import argparse
+import json
+import time
+
+import matplotlib.pyplot as plt
+import numpy as np
+import psycopg
+import pymongo
+from bson.binary import Binary, BinaryVectorDtype
+from pymongo.errors import OperationFailure
+from pymongo.operations import SearchIndexModel
+from tqdm.auto import tqdm
+
+from benchmark import RESULTS_DIR, format_stats, summarize
+from import_to_mongodb import MONGO_URL
+from import_to_pgsql import DB_URL
+
+SQL_CREATE_BENCH_VECTORS = """
+DROP TABLE IF EXISTS bench_vectors;
+CREATE TABLE bench_vectors (
+    id BIGINT PRIMARY KEY,
+    embedding vector({dims}) NOT NULL
+);
+"""
+
+SQL_CREATE_INDEX = {
+    "ivfflat": "CREATE INDEX bench_vectors_embedding_idx ON bench_vectors USING ivfflat (embedding vector_cosine_ops) WITH (lists = {lists})",
+    "hnsw": "CREATE INDEX bench_vectors_embedding_idx ON bench_vectors USING hnsw (embedding vector_cosine_ops) WITH (m = {m}, ef_construction = {ef_construction})",
+}
+
+SQL_INDEX_SETTINGS = """
+SET maintenance_work_mem TO '4GB';
+SET max_parallel_maintenance_workers TO 4;
+"""
+
+MONGO_INDEX_NAME = "bench_vectors_index"
+
+
+def parse_vector(text):
+    return np.array(json.loads(text), dtype=np.float32)
+
+
+def load_sample(conn, table, column, id_column, rows, queries, seed):
+    """
+    Copy `rows` random embeddings of table.column into bench_vectors and
+    return them together with `queries` other embeddings used as queries.
+    """
+    conn.execute("SELECT setseed(%s)", (seed,))
+    sample = conn.execute(
+        f"SELECT {id_column}, {column}::text FROM {table} WHERE {column} IS NOT NULL ORDER BY random() LIMIT %s",
+        (rows + queries,),
+    ).fetchall()
+    ids = np.array([row[0] for row in sample[:rows]])
+    vectors = np.stack([parse_vector(row[1]) for row in tqdm(sample, desc="Sample")])
+    base, query_vectors = vectors[:rows], vectors[rows:]
+
+    conn.execute(SQL_CREATE_BENCH_VECTORS.format(dims=vectors.shape[1]))
+    with conn.cursor() as cur, cur.copy(
+        "COPY bench_vectors (id, embedding) FROM STDIN"
+    ) as copy:
+        for id, text in tqdm(sample[:rows], desc="bench_vectors"):
+            copy.write_row((id, text))
+    conn.execute("ANALYZE bench_vectors")
+    return ids, base, query_vectors
+
+
+def normalize(vectors):
+    return vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+
+def numpy_search(normalized, ids, query, k):
+    scores = normalized @ (query / np.linalg.norm(query))
+    top = np.argpartition(-scores, k)[:k]
+    return ids[top[np.argsort(-scores[top])]]
+
+
+def vector2str(vector):
+    return f"[{','.join(map(str, vector))}]"
+
+
+def postgres_search(conn, query, k, settings):
+    with conn.transaction():
+        for name, value in settings.items():
+            conn.execute("SELECT set_config(%s, %s, true)", (name, str(value)))
+        rows = conn.execute(
+            "SELECT id FROM bench_vectors ORDER BY embedding <=> %s LIMIT %s",
+            (vector2str(query), k),
+        ).fetchall()
+    return [row[0] for row in rows]
+
+
+def evaluate(name, search, queries, truth, k, build_seconds=None, index_bytes=None, **params):
+    times, recalls = [], []
+    for query, expected in zip(tqdm(queries, desc=name), truth):
+        start = time.perf_counter()
+        found = search(query)
+        times.append(time.perf_counter() - start)
+        recalls.append(len(expected.intersection(found)) / k)
+    result = {
+        "method": name,
+        **params,
+        "k": k,
+        "recall": float(np.mean(recalls)),
+        "build_seconds": build_seconds,
+        "index_bytes": index_bytes,
+        **summarize(times),
+    }
+    settings = ", ".join(f"{key}={value}" for key, value in params.items())
+    print(
+        f"{name}{f' ({settings})' if settings else ''}: recall@{k}={result['recall']:.4f}, "
+        f"{format_stats(result)}"
+    )
+    return result
+
+
+def build_postgres_index(conn, method, **params):
+    conn.execute("DROP INDEX IF EXISTS bench_vectors_embedding_idx")
+    conn.execute(SQL_INDEX_SETTINGS)
+    start = time.perf_counter()
+    conn.execute(SQL_CREATE_INDEX[method].format(**params))
+    build_seconds = time.perf_counter() - start
+    index_bytes = conn.execute(
+        "SELECT pg_relation_size('bench_vectors_embedding_idx')"
+    ).fetchone()[0]
+    print(f"{method} build: {build_seconds:.2f}s, {index_bytes / 2**20:.1f} MiB")
+    return build_seconds, index_bytes
+
+
+def build_mongodb_index(collection, ids, base, timeout=600):
+    collection.drop()
+    for start in tqdm(range(0, len(ids), 1000), desc="MongoDB"):
+        collection.insert_many(
+            {
+                "id": int(id),
+                "embedding": Binary.from_vector(
+                    vector.tolist(), dtype=BinaryVectorDtype.FLOAT32
+                ),
+            }
+            for id, vector in zip(ids[start : start + 1000], base[start : start + 1000])
+        )
+
+    start = time.perf_counter()
+    collection.create_search_index(
+        SearchIndexModel(
+            definition={
+                "fields": [
+                    {
+                        "type": "vector",
+                        "path": "embedding",
+                        "numDimensions": base.shape[1],
+                        "similarity": "cosine",
+                    }
+                ]
+            },
+            name=MONGO_INDEX_NAME,
+            type="vectorSearch",
+        )
+    )
+    # Search indexes build asynchronously; wait until queries can use it.
+    while not any(
+        index.get("queryable")
+        for index in collection.list_search_indexes(MONGO_INDEX_NAME)
+    ):
+        if time.perf_counter() - start > timeout:
+            raise TimeoutError("MongoDB vector index did not become queryable")
+        time.sleep(1)
+    build_seconds = time.perf_counter() - start
+    print(f"mongodb build: {build_seconds:.2f}s")
+    return build_seconds
+
+
+def mongodb_search(collection, query, k, num_candidates):
+    return [
+        doc["id"]
+        for doc in collection.aggregate(
+            [
+                {
+                    "$vectorSearch": {
+                        "index": MONGO_INDEX_NAME,
+                        "path": "embedding",
+                        "queryVector": query.tolist(),
+                        "numCandidates": num_candidates,
+                        "limit": k,
+                    }
+                },
+                {"$project": {"_id": 0, "id": 1}},
+            ]
+        )
+    ]
+
+
+def run(args):
+    results = []
+    with psycopg.connect(DB_URL, autocommit=True) as conn:
+        ids, base, queries = load_sample(
+            conn, args.table, args.column, args.id_column, args.rows, args.queries, args.seed
+        )
+        normalized = normalize(base)
+        truth = [set(numpy_search(normalized, ids, q, args.k)) for q in queries]
+
+        if "numpy" in args.methods:
+            results.append(
+                evaluate(
+                    "numpy",
+                    lambda q: numpy_search(normalized, ids, q, args.k),
+                    queries,
+                    truth,
+                    args.k,
+                )
+            )
+
+        if "exact" in args.methods:
+            conn.execute("DROP INDEX IF EXISTS bench_vectors_embedding_idx")
+            results.append(
+                evaluate(
+                    "exact",
+                    lambda q: postgres_search(conn, q, args.k, {}),
+                    queries,
+                    truth,
+                    args.k,
+                )
+            )
+
+        if "ivfflat" in args.methods:
+            lists = args.lists or max(1, int(np.sqrt(args.rows)))
+            build_seconds, index_bytes = build_postgres_index(conn, "ivfflat", lists=lists)
+            for probes in args.probes:
+                results.append(
+                    evaluate(
+                        "ivfflat",
+                        lambda q: postgres_search(conn, q, args.k, {"ivfflat.probes": probes}),
+                        queries,
+                        truth,
+                        args.k,
+                        build_seconds,
+                        index_bytes,
+                        lists=lists,
+                        probes=probes,
+                    )
+                )
+
+        if "hnsw" in args.methods:
+            build_seconds, index_bytes = build_postgres_index(
+                conn, "hnsw", m=args.m, ef_construction=args.ef_construction
+            )
+            for ef_search in args.ef_search:
+                results.append(
+                    evaluate(
+                        "hnsw",
+                        lambda q: postgres_search(conn, q, args.k, {"hnsw.ef_search": ef_search}),
+                        queries,
+                        truth,
+                        args.k,
+                        build_seconds,
+                        index_bytes,
+                        m=args.m,
+                        ef_construction=args.ef_construction,
+                        ef_search=ef_search,
+                    )
+                )
+
+        conn.execute("DROP INDEX IF EXISTS bench_vectors_embedding_idx")
+
+    if "mongodb" in args.methods:
+        client = pymongo.MongoClient(MONGO_URL)
+        collection = client.get_database("amazon").get_collection("bench_vectors")
+        try:
+            build_seconds = build_mongodb_index(collection, ids, base)
+        except OperationFailure as e:
+            print(f"mongodb skipped, the server has no vector search: {e}")
+        else:
+            for num_candidates in args.num_candidates:
+                results.append(
+                    evaluate(
+                        "mongodb",
+                        lambda q: mongodb_search(collection, q, args.k, num_candidates),
+                        queries,
+                        truth,
+                        args.k,
+                        build_seconds,
+                        num_candidates=num_candidates,
+                    )
+                )
+        finally:
+            client.close()
+
+    return results
+
+
+def plot_recall_latency(results, k, filename):
+    plt.figure(figsize=(10, 6))
+    by_method = {}
+    for r in results:
+        by_method.setdefault(r["method"], []).append(r)
+    for method, rows in by_method.items():
+        plt.plot([r["p95"] for r in rows], [r["recall"] for r in rows], label=method, marker="s")
+
+    plt.xscale("log")
+    plt.xlabel("p95 latency (seconds)")
+    plt.ylabel(f"Recall@{k}")
+    plt.title("Vector Search")
+    plt.legend()
+    plt.grid(True)
+
+    plt.savefig(filename)
+    plt.close()
+
+
+def parse_ints(value):
+    return [int(v) for v in value.split(",")]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--table", default="products")
+    parser.add_argument("--column", default="title_embedding")
+    parser.add_argument("--id-column", default="product_id")
+    parser.add_argument("--rows", type=int, default=100000, help="vectors to index")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--seed", type=float, default=0.42)
+    parser.add_argument(
+        "--methods",
+        type=lambda v: v.split(","),
+        default=["numpy", "exact", "ivfflat", "hnsw", "mongodb"],
+    )
+    parser.add_argument("--lists", type=int, help="IVFFlat lists (default: sqrt(rows))")
+    parser.add_argument("--probes", type=parse_ints, default=[1, 5, 10, 20])
+    parser.add_argument("--m", type=int, default=16)
+    parser.add_argument("--ef-construction", type=int, default=64)
+    parser.add_argument("--ef-search", type=parse_ints, default=[20, 40, 80, 160])
+    parser.add_argument("--num-candidates", type=parse_ints, default=[100, 200, 400])
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--no-plot", action="store_true")
+    args = parser.parse_args()
+
+    results = run(args)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+    if not args.no_plot:
+        plot_recall_latency(results, args.k, f"{RESULTS_DIR}/vector_search.png")
@@ -0,0 +1,246 @@
+"""
+Generate a synthetic dataset with the same files and columns as the Amazon
+data in data/, at any scale:
+
+    categories.csv  catId, category
+    products.csv    productId, name, catIds
+    ratings.csv     userId, productId, rating, timestamp, title, comment
+    links.csv       amazonId, productId
+    merged_products.csv  productId, name, catIds, amazonId (no header, for logstash)
+
+Product popularity and user activity follow Zipf-like distributions, ratings
+lean towards 5 stars and timestamps towards recent years, so caches, indexes
+and per-product queries see a realistic skew. The same seed always produces
+the same files. They are written to data/synthetic unless --out says
+otherwise.
+
+    python generate_dataset.py --products 10000 --users 50000 --ratings 500000
+    python generate_dataset.py --out /tmp/data --seed 7
+"""
+
+import argparse
+import csv
+from pathlib import Path
+
+import numpy as np
+from tqdm.auto import tqdm
+
+from import_to_pgsql import this_dir
+
+# Next to the real data, never over it; point DATA_DIR here to import it.
+SYNTHETIC_DIR = Path(this_dir()).resolve().parent / "data" / "synthetic"
+
+CATEGORY_NAMES = [
+    "Electronics", "Camera & Photo", "Headphones", "Computers", "Cell Phones",
+    "Books", "Kitchen & Dining", "Home & Garden", "Toys & Games", "Sports & Outdoors",
+    "Clothing", "Shoes", "Beauty", "Health", "Automotive", "Office Products",
+    "Musical Instruments", "Video Games", "Pet Supplies", "Tools",
+]
+
+BRANDS = [
+    "Acme", "Zenith", "Nova", "Apex", "Orbit", "Pioneer", "Summit", "Vertex",
+    "Lumen", "Northwind", "Everest", "Polar", "Solaris", "Cobalt", "Atlas",
+]
+
+ADJECTIVES = [
+    "Digital", "Wireless", "Portable", "Compact", "Professional", "Classic",
+    "Smart", "Ultra", "Mini", "Premium", "Rechargeable", "Waterproof",
+    "Lightweight", "Heavy Duty", "Ergonomic", "Vintage", "Deluxe", "Slim",
+]
+
+NOUNS = [
+    "Camera", "Lens", "Tripod", "Headphones", "Speaker", "Keyboard", "Mouse",
+    "Monitor", "Laptop", "Charger", "Cable", "Router", "Printer", "Watch",
+    "Blender", "Toaster", "Coffee Maker", "Kettle", "Lamp", "Chair", "Desk",
+    "Backpack", "Tent", "Running Shoes", "Jacket", "Guitar", "Board Game",
+    "Puzzle", "Novel", "Cookbook", "Drill", "Vacuum", "Phone Case", "Hard Drive",
+]
+
+POSITIVE_WORDS = [
+    "great", "excellent", "love", "perfect", "works", "recommend", "quality",
+    "sturdy", "fast", "beautiful", "comfortable", "easy", "value", "happy",
+]
+
+NEGATIVE_WORDS = [
+    "broke", "poor", "returned", "disappointed", "cheap", "slow", "noisy",
+    "stopped", "waste", "defective", "flimsy", "difficult", "refund", "bad",
+]
+
+NEUTRAL_WORDS = [
+    "the", "it", "this", "product", "after", "use", "week", "month", "for",
+    "and", "with", "was", "is", "my", "price", "size", "color", "battery",
+    "delivery", "box", "instructions", "again", "would", "buy",
+]
+
+# Share of 1..5 star ratings, roughly the J-shape of real product reviews.
+RATING_WEIGHTS = [0.07, 0.05, 0.08, 0.2, 0.6]
+
+TIMESTAMP_START = 946684800  # 2000-01-01
+TIMESTAMP_END = 1735689600  # 2025-01-01
+
+
+def zipf_weights(n, s, rng):
+    """Zipf-like probabilities over n items, assigned to a random permutation."""
+    weights = 1.0 / np.arange(1, n + 1) ** s
+    rng.shuffle(weights)
+    return weights / weights.sum()
+
+
+def write_categories(path, num):
+    names = [
+        CATEGORY_NAMES[i] if i < len(CATEGORY_NAMES) else f"Category {i}"
+        for i in range(num)
+    ]
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["catId", "category"])
+        for i, name in enumerate(names):
+            writer.writerow([i, name])
+
+
+def generate_products(num, num_categories, rng):
+    products = []
+    for product_id in range(1, num + 1):
+        name = " ".join(
+            [
+                str(rng.choice(BRANDS)),
+                str(rng.choice(ADJECTIVES)),
+                str(rng.choice(NOUNS)),
+                f"{rng.integers(100, 9999)}",
+            ]
+        )
+        cat_ids = rng.choice(
+            num_categories, size=min(rng.integers(1, 4), num_categories), replace=False
+        )
+        products.append((product_id, name, ",".join(map(str, cat_ids))))
+    return products
+
+
+def write_products(path, products):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["productId", "name", "catIds"])
+        writer.writerows(products)
+
+
+def generate_links(products, share, rng):
+    alphabet = np.array(list("ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"))
+    return {
+        product_id: "B0" + "".join(rng.choice(alphabet, size=8))
+        for product_id, _, _ in products
+        if rng.random() < share
+    }
+
+
+def write_links(path, links):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["amazonId", "productId"])
+        for product_id, amazon_id in links.items():
+            writer.writerow([amazon_id, product_id])
+
+
+def write_merged_products(path, products, links):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        for product_id, name, cat_ids in products:
+            writer.writerow([product_id, name, cat_ids, links.get(product_id, "")])
+
+
+def review_texts(ratings, min_words, max_words, rng):
+    """One text per rating; about 30% of the words carry the rating's sentiment."""
+    lengths = rng.integers(min_words, max_words, size=len(ratings))
+    total = int(lengths.sum())
+    row_ratings = np.repeat(ratings, lengths)
+    sentiment = rng.random(total) < 0.3
+    words = np.where(
+        sentiment & (row_ratings >= 4),
+        rng.choice(POSITIVE_WORDS, total),
+        np.where(
+            sentiment & (row_ratings <= 2),
+            rng.choice(NEGATIVE_WORDS, total),
+            rng.choice(NEUTRAL_WORDS, total),
+        ),
+    ).tolist()
+    ends = np.cumsum(lengths).tolist()
+    return [
+        " ".join(words[start:end]).capitalize()
+        for start, end in zip([0] + ends[:-1], ends)
+    ]
+
+
+def write_ratings(path, products, num, num_users, args, rng, chunk_size=100000):
+    product_ids = np.array([product_id for product_id, _, _ in products])
+    product_weights = zipf_weights(len(product_ids), args.product_skew, rng)
+    user_weights = zipf_weights(num_users, args.user_skew, rng)
+
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["userId", "productId", "rating", "timestamp", "title", "comment"])
+        with tqdm(total=num, desc="Ratings") as progress:
+            for start in range(0, num, chunk_size):
+                size = min(chunk_size, num - start)
+                chunk_products = rng.choice(product_ids, size=size, p=product_weights)
+                chunk_users = rng.choice(num_users, size=size, p=user_weights) + 1
+                ratings = rng.choice(5, size=size, p=RATING_WEIGHTS) + 1
+                # power(3) leans towards the end of the range, i.e. recent years
+                timestamps = TIMESTAMP_START + (
+                    (TIMESTAMP_END - TIMESTAMP_START) * rng.power(3, size=size)
+                ).astype(np.int64)
+                missing_user = rng.random(size) < args.missing_user_share
+                users = np.where(missing_user, "", chunk_users.astype(str))
+                titles = review_texts(ratings, 2, 6, rng)
+                comments = review_texts(ratings, 8, 40, rng)
+                writer.writerows(
+                    zip(
+                        users.tolist(),
+                        chunk_products.tolist(),
+                        ratings.tolist(),
+                        timestamps.tolist(),
+                        titles,
+                        [comment + "." for comment in comments],
+                    )
+                )
+                progress.update(size)
+
+
+def main(args):
+    rng = np.random.default_rng(args.seed)
+    out = Path(args.out)
+    out.mkdir(parents=True, exist_ok=True)
+
+    write_categories(out / "categories.csv", args.categories)
+    products = generate_products(args.products, args.categories, rng)
+    write_products(out / "products.csv", products)
+    links = generate_links(products, args.link_share, rng)
+    write_links(out / "links.csv", links)
+    write_merged_products(out / "merged_products.csv", products, links)
+    write_ratings(out / "ratings.csv", products, args.ratings, args.users, args, rng)
+    print(
+        f"Wrote {args.categories} categories, {args.products} products, "
+        f"{len(links)} links and {args.ratings} ratings to {out}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic dataset")
+    parser.add_argument("--out", default=str(SYNTHETIC_DIR))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=50000)
+    parser.add_argument("--ratings", type=int, default=500000)
+    parser.add_argument(
+        "--product-skew", type=float, default=1.1, help="Zipf exponent of product popularity"
+    )
+    parser.add_argument(
+        "--user-skew", type=float, default=0.9, help="Zipf exponent of user activity"
+    )
+    parser.add_argument("--link-share", type=float, default=0.8)
+    parser.add_argument(
+        "--missing-user-share",
+        type=float,
+        default=0.001,
+        help="share of ratings without a userId, as in the real data",
+    )
+    main(parser.parse_args())